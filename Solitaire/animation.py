@@ -0,0 +1,255 @@
+"""
+card animations. every card has a slot in a set of arrays made once when
+the game starts, holding its tween, so starting, running and finishing
+animations makes no tween objects. time moves in fixed steps so tweens
+start and finish on the same step whatever the frame rate, and frames
+drawn between steps get positions eased to the exact time.
+
+piles still lay their cards out at once. the animator runs after them,
+puts each card that changed pile back where it was drawn and flies it to
+its new place, turning it over on the way if it changed side
+"""
+import time
+from array import array
+import pygame
+import gameobject
+
+#milliseconds per fixed step
+STEP = 8
+#steps caught up in one frame after a stall, the rest of the time is dropped
+MAX_STEPS = 12
+#lengths in steps
+FLIGHT = 20
+TURN = 16
+#steps between the cards of a cascade
+CASCADE = 5
+#part of the way to the pointer dragged cards close each step
+FOLLOW = 0.5
+
+#what a slot is doing
+MOVING = 1
+TURNING = 2
+
+
+def ticks() -> float:
+    """milliseconds from a clock that runs without pygame's timer set up"""
+    return time.perf_counter() * 1000
+
+def ease_out(progress) -> float:
+    """fast start and gentle landing, for flights"""
+    return 1 - (1 - progress) ** 3
+
+def ease_in_out(progress) -> float:
+    """slow at both ends, for turning over"""
+    if progress < 0.5:
+        return 2 * progress * progress
+    return 1 - 2 * (1 - progress) * (1 - progress)
+
+
+class animator(gameobject.game_object):
+    def __init__(self, cards, clock=ticks):
+        #cards indexed by their engine code, a card's code is its slot
+        self.cards = cards
+        self.clock = clock
+        #off, cards go straight to their place, for tools that read positions
+        self.enabled = True
+        size = len(cards)
+        self.kind = array("b", [0]) * size
+        self.start_x = array("i", [0]) * size
+        self.start_y = array("i", [0]) * size
+        self.end_x = array("i", [0]) * size
+        self.end_y = array("i", [0]) * size
+        self.begin = array("i", [0]) * size
+        self.length = array("i", [0]) * size
+        self.delay = array("i", [0]) * size
+        self.waiting = array("b", [0]) * size
+        self.was_visible = array("b", [0]) * size
+        #component holding each card, told when the card lands
+        self.owners = [None] * size
+        #area each card was last drawn in
+        self.drawn = [pygame.Rect(0, 0, 64, 64) for x in range(size)]
+
+        #slots waiting for their new place, running, and drawn this frame
+        self.pending = []
+        self.active = []
+        self.moved = []
+
+        self.time = 0
+        self.remainder = 0
+        self.last = None
+
+        #cards being dragged trail the pointer by this much
+        self.dragged = None
+        self.lag_x = 0
+        self.lag_y = 0
+
+    def running(self) -> bool:
+        return len(self.active) != 0 or len(self.pending) != 0 or \
+               self.lag_x != 0 or self.lag_y != 0
+
+    def depart(self, cards, owner, delay=0):
+        """
+        Called before cards are given a new place in owner, remembers where
+        and which side up each was drawn. The flight starts once owner has
+        laid them out, after delay steps.
+        """
+        for card in cards:
+            code = card.code
+            self.owners[code] = owner
+            if self.waiting[code]:
+                #departed twice in a frame, keep where it was first drawn
+                self.delay[code] = max(self.delay[code], delay)
+                continue
+            if self.kind[code] == 0:
+                self.was_visible[code] = card.visibility
+            self.waiting[code] = 1
+            self.start_x[code] = card.position.x
+            self.start_y[code] = card.position.y
+            self.delay[code] = delay
+            self.pending.append(code)
+
+    def stop(self, cards):
+        """
+        Puts cards picked up mid flight straight in their place, so they are
+        dragged as a neat stack from where the pile has them.
+        """
+        for card in cards:
+            code = card.code
+            if self.kind[code] != 0:
+                self.active.remove(code)
+                self.moved.append(code)
+                if self.kind[code] & MOVING:
+                    card.position.x = self.end_x[code]
+                    card.position.y = self.end_y[code]
+            if self.waiting[code]:
+                self.pending.remove(code)
+                self.waiting[code] = 0
+            self.kind[code] = 0
+            card.flying = False
+            card.turning = False
+            card.width = 64
+
+    def follow(self, component, rel):
+        """the pointer moved while component's cards are dragged"""
+        self.dragged = component
+        self.lag_x += rel[0]
+        self.lag_y += rel[1]
+
+    def update_pos(self):
+        now = self.clock()
+        if not self.running():
+            self.last = now
+            return
+        elapsed = now - (now if self.last == None else self.last) + self.remainder
+        self.last = now
+        steps, self.remainder = divmod(elapsed, STEP)
+        steps = int(steps)
+        if steps > MAX_STEPS:
+            steps, self.remainder = MAX_STEPS, 0
+        self.time += steps
+        if len(self.pending) != 0:
+            self.start()
+        if self.lag_x != 0 or self.lag_y != 0:
+            self.drag(steps)
+
+        #eased to the exact time, between the last step and the next
+        now = self.time + self.remainder / STEP
+        index = 0
+        for code in self.active:
+            card = self.cards[code]
+            kind = self.kind[code]
+            self.moved.append(code)
+            progress = max(0, (now - self.begin[code]) / self.length[code])
+            if progress >= 1 or not self.enabled:
+                if kind & MOVING:
+                    card.position.x = self.end_x[code]
+                    card.position.y = self.end_y[code]
+                self.land(card)
+                continue
+            self.active[index] = code
+            index += 1
+            if kind & MOVING:
+                eased = ease_out(progress)
+                card.position.x = self.start_x[code] + \
+                                  round((self.end_x[code] - self.start_x[code]) * eased)
+                card.position.y = self.start_y[code] + \
+                                  round((self.end_y[code] - self.start_y[code]) * eased)
+            if kind & TURNING:
+                #narrows to nothing showing the old side, then widens
+                eased = ease_in_out(progress)
+                card.turning = eased < 0.5
+                card.width = round(64 * abs(1 - 2 * eased))
+        del self.active[index:]
+
+    def start(self):
+        """starts tweens for pending cards now their owners laid them out"""
+        for code in self.pending:
+            card = self.cards[code]
+            self.waiting[code] = 0
+            kind = 0
+            if card.position.x != self.start_x[code] or card.position.y != self.start_y[code]:
+                kind |= MOVING
+            if card.visibility != self.was_visible[code]:
+                kind |= TURNING
+            if kind == 0 or not self.enabled:
+                #already where it belongs, stop it if it was on its way
+                if self.kind[code] != 0:
+                    self.active.remove(code)
+                    self.moved.append(code)
+                    self.land(card)
+                continue
+            if self.kind[code] == 0:
+                self.active.append(code)
+                self.drawn[code].topleft = (self.start_x[code], self.start_y[code])
+            self.kind[code] = kind
+            self.end_x[code] = card.position.x
+            self.end_y[code] = card.position.y
+            self.begin[code] = self.time + self.delay[code]
+            self.length[code] = FLIGHT if kind & MOVING else TURN
+            card.position.x = self.start_x[code]
+            card.position.y = self.start_y[code]
+            card.flying = kind & MOVING != 0
+            card.turning = kind & TURNING != 0
+        self.pending.clear()
+
+    def land(self, card):
+        """the card's tween is over, its owner draws it from now on"""
+        self.kind[card.code] = 0
+        card.flying = False
+        card.turning = False
+        card.width = 64
+        self.owners[card.code].changed()
+
+    def drag(self, steps):
+        """closes part of the gap between the dragged cards and the pointer"""
+        if self.dragged == None or len(self.dragged.cards) == 0:
+            self.lag_x = self.lag_y = 0
+            return
+        keep = (1 - FOLLOW) ** steps if self.enabled else 0
+        #truncated towards zero so the gap always closes
+        lag_x, lag_y = int(self.lag_x * keep), int(self.lag_y * keep)
+        shift = (self.lag_x - lag_x, self.lag_y - lag_y)
+        self.lag_x, self.lag_y = lag_x, lag_y
+        if shift != (0, 0):
+            for card in self.dragged.cards:
+                card.position.move_ip(shift)
+            self.dragged.changed()
+
+    def invalidated(self) -> list:
+        #each card's area last frame and this frame, moves between frames are
+        #small so one rect covering both is barely bigger than the card
+        rects = []
+        for code in self.moved:
+            position = self.cards[code].position
+            drawn = self.drawn[code]
+            rects.append(drawn.union((position.x, position.y, 64, 64)))
+            drawn.topleft = position.topleft
+        self.moved.clear()
+        return rects
+
+    def render(self, draw_surface):
+        #flying cards go over every pile, their owners leave them out
+        clip = draw_surface.get_clip()
+        for code in self.active:
+            if self.kind[code] & MOVING and self.drawn[code].colliderect(clip):
+                self.cards[code].render(draw_surface)
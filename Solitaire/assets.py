@@ -0,0 +1,198 @@
+"""
+loads every image asset once, converts it to the display pixel format and
+packs it into a single atlas surface. game objects ask for assets by name
+and get back a subsurface of the atlas instead of decoding a png each frame.
+
+the packed atlas is also kept prebuilt in one bundle file of raw pixels,
+which is memory mapped and handed straight to the display conversion so
+startup decodes no pngs. the bundle holds a hash of the pngs it was built
+from and is passed over for them when it doesn't match. after changing an
+image rebuild it with
+
+    python assets.py
+"""
+import hashlib
+import mmap
+import os
+import struct
+import sys
+from collections import OrderedDict
+import pygame
+from engine import SUITS, VALUES
+
+ASSET_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets")
+BUNDLE_PATH = os.path.join(ASSET_DIR, "atlas.bundle")
+ATLAS_WIDTH = 832
+#scaled copies of the atlas kept at once, one per window scale
+SCALED_SETS = 3
+
+#every asset used by the game, packed into the atlas in this order
+NAMES = (["card_" + suit + "_" + value for suit in SUITS for value in VALUES] +
+         ["card_back", "deck_empty"] +
+         ["foundation_" + suit for suit in SUITS] +
+         ["new_game"])
+
+BUNDLE_MAGIC = b"SOLB"
+#magic, atlas width and height, number of regions, offset of the pixels and
+#the fingerprint of the pngs
+BUNDLE_HEADER = struct.Struct("<4sHHHI8s")
+#asset name and its region of the atlas
+BUNDLE_REGION = struct.Struct("<24sHHHH")
+
+
+class atlas:
+    def __init__(self, names):
+        self.names = names
+        self.surface = None
+        self.regions = {}
+        self.assets = {}
+        #images decoded from disk so far, read by the profiler
+        self.loads = 0
+        #asset name of each surface handed out, to find its scaled copies
+        self.names_by_surface = {}
+        #scale -> {name : surface}, least recently used first
+        self.scaled_sets = OrderedDict()
+
+    def load(self):
+        """
+        Fills the atlas from the bundle, or from the pngs when there is no
+        bundle or it can't be used. Needs a display mode to be set so
+        surfaces can be converted.
+        """
+        if not self.load_bundle(BUNDLE_PATH):
+            surface, self.regions = self.pack()
+            self.surface = surface.convert_alpha()
+        for name, region in self.regions.items():
+            self.assets[name] = self.surface.subsurface(region)
+            self.names_by_surface[self.assets[name]] = name
+
+    def pack(self) -> tuple:
+        """
+        Decodes each png once and blits it into an unconverted atlas using
+        simple shelf packing, returns the atlas and the region of each name.
+        """
+        images = {}
+        for name in self.names:
+            images[name] = pygame.image.load(os.path.join(ASSET_DIR, name + ".png"))
+        self.loads += len(images)
+
+        regions = {}
+        x, y, shelf_height = 0, 0, 0
+        for name in self.names:
+            width, height = images[name].get_size()
+            if x + width > ATLAS_WIDTH:
+                x, y, shelf_height = 0, y + shelf_height, 0
+            regions[name] = pygame.Rect(x, y, width, height)
+            x += width
+            shelf_height = max(shelf_height, height)
+
+        #cards use a black colour key and the foundations use per pixel
+        #alpha, both end up as transparent pixels in an alpha atlas
+        surface = pygame.Surface((ATLAS_WIDTH, y + shelf_height), pygame.SRCALPHA)
+        surface.fill((0, 0, 0, 0))
+        for name, image in images.items():
+            surface.blit(image, regions[name])
+        return surface, regions
+
+    def load_bundle(self, path) -> bool:
+        """
+        Maps the bundle and converts its pixels in place, nothing is decoded
+        or copied before the conversion. False if it can't be used, because
+        it is missing, cut short or was built from other pngs.
+        """
+        try:
+            bundle = open(path, "rb")
+            with bundle, mmap.mmap(bundle.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                return self.read_bundle(mapped)
+        except (OSError, ValueError, struct.error):
+            return False
+
+    def read_bundle(self, mapped) -> bool:
+        """load_bundle's work on the mapped file"""
+        magic, width, height, count, offset, built_from = BUNDLE_HEADER.unpack_from(mapped)
+        if magic != BUNDLE_MAGIC or count != len(self.names) or \
+           offset + width * height * 4 > len(mapped) or \
+           built_from != fingerprint(self.names):
+            return False
+        regions = {}
+        for index in range(count):
+            name, x, y, region_width, region_height = BUNDLE_REGION.unpack_from(
+                mapped, BUNDLE_HEADER.size + index * BUNDLE_REGION.size)
+            regions[name.rstrip(b"\0").decode()] = pygame.Rect(
+                x, y, region_width, region_height)
+        if set(regions) != set(self.names):
+            return False
+        with memoryview(mapped)[offset:offset + width * height * 4] as pixels:
+            raw = pygame.image.frombuffer(pixels, (width, height), "RGBA")
+            self.surface = raw.convert_alpha()
+            #the raw surface borrows the mapping, it must go before the unmap
+            del raw
+        self.regions = regions
+        return True
+
+    def get(self, name) -> pygame.Surface:
+        if self.surface is None:
+            self.load()
+        return self.assets[name]
+
+    def scaled(self, surface, scale) -> pygame.Surface:
+        """
+        The copy of an atlas surface for a window scale, or None for a
+        surface that isn't in the atlas. Every asset is smooth scaled once
+        the first time a scale is asked for, and only the most recently used
+        few scales are kept.
+        """
+        name = self.names_by_surface.get(surface)
+        if name == None:
+            return None
+        if scale in self.scaled_sets:
+            self.scaled_sets.move_to_end(scale)
+            return self.scaled_sets[scale][name]
+        scaled_set = {}
+        for asset_name, asset in self.assets.items():
+            width, height = asset.get_size()
+            scaled_set[asset_name] = pygame.transform.smoothscale(
+                asset, (int(width * scale), int(height * scale)))
+        self.scaled_sets[scale] = scaled_set
+        if len(self.scaled_sets) > SCALED_SETS:
+            self.scaled_sets.popitem(last=False)
+        return scaled_set[name]
+
+
+_atlas = atlas(NAMES)
+
+
+def get(name) -> pygame.Surface:
+    return _atlas.get(name)
+
+def scaled(surface, scale) -> pygame.Surface:
+    return _atlas.scaled(surface, scale)
+
+def loads() -> int:
+    return _atlas.loads
+
+def fingerprint(names) -> bytes:
+    """hash of the pngs' contents, cheaper than decoding them and kept across checkouts"""
+    digest = hashlib.blake2b(digest_size=8)
+    for name in names:
+        with open(os.path.join(ASSET_DIR, name + ".png"), "rb") as image:
+            digest.update(image.read())
+    return digest.digest()
+
+def build_bundle(path=BUNDLE_PATH):
+    """packs the pngs and writes the atlas and its regions as a bundle"""
+    surface, regions = atlas(NAMES).pack()
+    width, height = surface.get_size()
+    offset = BUNDLE_HEADER.size + len(regions) * BUNDLE_REGION.size
+    with open(path, "wb") as bundle:
+        bundle.write(BUNDLE_HEADER.pack(BUNDLE_MAGIC, width, height, len(regions), offset,
+                                        fingerprint(NAMES)))
+        for name, region in regions.items():
+            bundle.write(BUNDLE_REGION.pack(name.encode(), *region))
+        bundle.write(pygame.image.tobytes(surface, "RGBA"))
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else BUNDLE_PATH
+    build_bundle(path)
+    print("wrote", path)
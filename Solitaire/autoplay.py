@@ -0,0 +1,69 @@
+"""
+sends cards to the foundation without the player dragging them. once the
+stock side is empty and every column card is face up the rest of the game
+is put away in one pass, and safe auto play sends on cards nothing could
+still be placed on after each move. both only look again at the piles a
+card they sent could have changed, so the work grows with the cards moved
+"""
+import engine
+
+#piles whose top card can go to the foundation
+SOURCES = list(range(engine.COLUMNS)) + [engine.EXTRA]
+
+
+def can_complete(state) -> bool:
+    """all that is left is face up in the columns"""
+    return state.won() and not any(state.hidden) and \
+           any(len(cards) != 0 for cards in state.columns)
+
+def complete(state) -> list:
+    """
+    Sends every card left to the foundation and returns the undo records,
+    or nothing when can_complete is false. With every card face up each
+    column is one run down from its bottom card, so once the lower ranks
+    are home every card of the next rank is on top of its column. The
+    cards are bucketed by rank in one pass over the columns and played
+    lowest rank first.
+    """
+    if not can_complete(state):
+        return []
+    ranks = [[] for value in range(13)]
+    for column in range(engine.COLUMNS):
+        for card in state.columns[column]:
+            ranks[card >> 2].append(engine.move(column, engine.FOUNDATION + (card & 3)))
+    records = []
+    for moves in ranks:
+        for move in moves:
+            #only a column that is not a run could stop it, left as it is
+            if not state.is_legal(move):
+                return records
+            records.append(state.apply(move))
+    return records
+
+def safe_moves(state) -> list:
+    """
+    Sends the cards on top of the columns and the extra cards to the
+    foundation while they are safe, see engine.safe, and returns the undo
+    records. After each card sent only the pile it came off and piles
+    whose top card is one rank higher are looked at again, those are the
+    only cards it could have made safe or next on their suit.
+    """
+    records = []
+    work = list(SOURCES)
+    while len(work) != 0:
+        pile = work.pop()
+        cards = state.extra if pile == engine.EXTRA else state.columns[pile]
+        if len(cards) == 0:
+            continue
+        card = cards[-1]
+        if not engine.can_found(card, state.foundation) or \
+           not engine.safe(card, state.foundation):
+            continue
+        records.append(state.apply(engine.move(pile, engine.FOUNDATION + (card & 3))))
+        work.append(pile)
+        above = (card >> 2) + 1
+        for source in SOURCES:
+            cards = state.extra if source == engine.EXTRA else state.columns[source]
+            if source != pile and len(cards) != 0 and cards[-1] >> 2 == above:
+                work.append(source)
+    return records
@@ -0,0 +1,167 @@
+"""
+plays large numbers of deals headlessly across a process pool to estimate
+win rates and score distributions. work is handed out as seed ranges and
+each chunk sends back one small tally, game objects never leave a worker
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, as_completed, wait
+import deals
+import engine
+import moveindex
+import solver
+
+
+#policies pick the next move for a game, or None to stop playing
+def random_policy(state, generator):
+    return generator.choice(state.legal_moves())
+
+def greedy_policy(state, generator):
+    """the legal move moveindex.rank puts first, moves ranked 0 are never played"""
+    best = None
+    best_rank = 0
+    for move in state.legal_moves():
+        rank = moveindex.rank(state, move)
+        if rank > best_rank:
+            best = move
+            best_rank = rank
+    return best
+
+
+POLICIES = {"random" : random_policy,
+            "greedy" : greedy_policy,
+            "solver" : None}
+
+
+def new_tally() -> dict:
+    return {"games" : 0,
+            "wins" : 0,
+            "unknown" : 0,
+            "moves" : 0,
+            "score" : 0,
+            "foundation" : 0,
+            "scores" : {}}
+
+def play_chunk(start, stop, policy, max_moves, max_nodes) -> dict:
+    """plays the deals numbered start to stop and tallies the results"""
+    tally = new_tally()
+    #any win will do for a win rate, the shortest search would use up the budget
+    finder = solver.solver(max_nodes=max_nodes, shortest=False) if policy == "solver" else None
+    for seed in range(start, stop):
+        state = engine.game(deals.deal(seed), seed)
+        moves = 0
+        if finder != None:
+            solution = finder.solve(state)
+            if solution == None:
+                if not finder.complete:
+                    tally["unknown"] += 1
+            else:
+                for move in solution:
+                    state.apply(move)
+                moves = len(solution)
+        else:
+            choose = POLICIES[policy]
+            generator = random.Random(seed)
+            draws = 0
+            while moves < max_moves and not state.won():
+                move = choose(state, generator)
+                if move == None:
+                    break
+                #a whole pass through the stock without another move is stuck
+                draws = draws + 1 if move == engine.DRAW else 0
+                if draws > len(state.stock) + len(state.waste) + len(state.extra) + 1:
+                    break
+                state.apply(move)
+                moves += 1
+
+        tally["games"] += 1
+        tally["wins"] += state.won()
+        tally["moves"] += moves
+        tally["score"] += state.score
+        tally["foundation"] += sum(state.foundation)
+        bucket = state.score // 10 * 10
+        tally["scores"][bucket] = tally["scores"].get(bucket, 0) + 1
+    return tally
+
+
+class report:
+    def __init__(self):
+        self.tally = new_tally()
+
+    def add(self, tally):
+        for key, value in tally.items():
+            if key == "scores":
+                for bucket, count in value.items():
+                    self.tally["scores"][bucket] = self.tally["scores"].get(bucket, 0) + count
+            else:
+                self.tally[key] += value
+
+    def summary(self) -> str:
+        tally = self.tally
+        games = max(tally["games"], 1)
+        lines = [f"games: {tally['games']}",
+                 f"wins: {tally['wins']} ({100 * tally['wins'] / games:.2f}%)",
+                 f"mean score: {tally['score'] / games:.2f}",
+                 f"mean moves: {tally['moves'] / games:.2f}",
+                 f"mean cards on foundation: {tally['foundation'] / games:.2f}"]
+        if tally["unknown"] != 0:
+            lines.append(f"solver gave up: {tally['unknown']}")
+        lines.append("score distribution:")
+        for bucket in sorted(tally["scores"]):
+            lines.append(f"  {bucket:>4}-{bucket + 9:<4} {tally['scores'][bucket]}")
+        return "\n".join(lines)
+
+
+def run(start, stop, policy="greedy", workers=None, chunk=250, max_moves=1000,
+        max_nodes=20000, progress=None) -> report:
+    """
+    Splits the seed range into chunks and keeps a few per worker in flight
+    so results stream back into the report as they finish.
+    """
+    results = report()
+    chunks = ((first, min(first + chunk, stop)) for first in range(start, stop, chunk))
+    workers = workers or os.cpu_count()
+    with ProcessPoolExecutor(workers) as pool:
+        pending = set()
+        for first, last in chunks:
+            pending.add(pool.submit(play_chunk, first, last, policy, max_moves, max_nodes))
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results.add(future.result())
+                    if progress != None:
+                        progress(results)
+        for future in as_completed(pending):
+            results.add(future.result())
+            if progress != None:
+                progress(results)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="play many deals headlessly")
+    parser.add_argument("seeds", help="range of deals to play, start:stop")
+    parser.add_argument("--policy", choices=POLICIES, default="greedy")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk", type=int, default=250,
+                        help="deals per work unit")
+    parser.add_argument("--moves", type=int, default=1000,
+                        help="moves before a game is given up")
+    parser.add_argument("--nodes", type=int, default=20000,
+                        help="solver node budget per deal")
+    arguments = parser.parse_args()
+    start, stop = (int(part) for part in arguments.seeds.split(":"))
+
+    def show(results):
+        print(f"\r{results.tally['games']} / {stop - start}", end="", file=sys.stderr)
+
+    started = time.perf_counter()
+    results = run(start, stop, arguments.policy, arguments.workers, arguments.chunk,
+                  arguments.moves, arguments.nodes, show)
+    elapsed = time.perf_counter() - started
+    print(file=sys.stderr)
+    print(results.summary())
+    print(f"{results.tally['games'] / elapsed:.1f} games per second")
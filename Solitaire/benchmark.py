@@ -0,0 +1,376 @@
+"""
+repeatable performance numbers. recorded mouse traces are replayed into a
+solitaire window on the sdl dummy driver, timing event_handler, update_pos
+and render for every event, and the engine gets microbenchmarks of its own.
+results are written as json so a run can be compared with a stored one
+
+    python benchmark.py --output today.json --baseline before.json
+    python benchmark.py --make-traces
+"""
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+import argparse
+import itertools
+import json
+import random
+import subprocess
+import sys
+import time
+import timeit
+import tracemalloc
+import pygame
+import deals
+import engine
+import gamelogic
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+TRACES = os.path.join(HERE, "traces")
+PHASES = ["event_handler", "update_pos", "render"]
+FRAME_MS = 1000 / 60
+EVENT_TYPES = {"down" : pygame.MOUSEBUTTONDOWN,
+               "up" : pygame.MOUSEBUTTONUP,
+               "motion" : pygame.MOUSEMOTION}
+
+
+#trace making. a trace is a deal number and a list of mouse events, each
+#[kind, x, y] with the movement since the last event added for motion
+class trace_writer:
+    def __init__(self, game):
+        self.game = game
+        #presses are aimed at where cards are laid out, not where they fly
+        game.animations.enabled = False
+        self.events = []
+        self.mouse = (0, 0)
+
+    def send(self, kind, pos):
+        x, y = pos
+        if kind == "motion":
+            self.events.append([kind, x, y, x - self.mouse[0], y - self.mouse[1]])
+        else:
+            self.events.append([kind, x, y])
+        self.mouse = pos
+        self.game.event_handler(event(self.events[-1]))
+        self.game.update_pos()
+
+    def click(self, pos):
+        self.send("down", pos)
+        self.send("up", pos)
+
+    def drag(self, start, end, steps=20):
+        """presses at start, moves to end in even steps and lets go"""
+        self.send("down", start)
+        for step in range(1, steps + 1):
+            self.send("motion", (start[0] + (end[0] - start[0]) * step // steps,
+                                 start[1] + (end[1] - start[1]) * step // steps))
+        self.send("up", end)
+
+def event(entry):
+    kind, x, y = entry[:3]
+    if kind == "motion":
+        return pygame.event.Event(EVENT_TYPES[kind], pos=(x, y), rel=(entry[3], entry[4]),
+                                  buttons=(1, 0, 0))
+    return pygame.event.Event(EVENT_TYPES[kind], pos=(x, y), button=1)
+
+def grab_point(game, move) -> tuple:
+    """where to press to pick up the cards a move takes"""
+    origin = engine.source(move)
+    if origin == engine.EXTRA:
+        cards = game.components["extra_cards"].cards
+        return cards[-1].position.move(10, 10).topleft
+    cards = game.components["column_" + str(origin + 1)].cards
+    return cards[len(cards) - engine.count(move)].position.move(10, 5).topleft
+
+def drop_point(game, move) -> tuple:
+    target = engine.destination(move)
+    if target >= engine.FOUNDATION:
+        suit = engine.SUITS[target - engine.FOUNDATION]
+        return game.components["foundation"].positions[suit].center
+    return (64 * (target + 1) + 32, 300)
+
+def draws_trace(deal_number) -> dict:
+    """clicks through the stock again and again, flipping and recycling"""
+    game = gamelogic.solitaire(deal_number)
+    writer = trace_writer(game)
+    for x in range(150):
+        writer.click((32, 32))
+    return {"deal" : deal_number, "events" : writer.events}
+
+def long_drags_trace(deal_number) -> dict:
+    """
+    Picks up the tallest face up run of every column and carries it around
+    the table before dropping it back where it came from.
+    """
+    game = gamelogic.solitaire(deal_number)
+    writer = trace_writer(game)
+    for lap in range(5):
+        for number in range(engine.COLUMNS):
+            column = game.components["column_" + str(number + 1)]
+            hidden = game.state.hidden[number]
+            if len(column.cards) == 0:
+                continue
+            start = column.cards[hidden].position.move(10, 5).topleft
+            writer.send("down", start)
+            for step in range(60):
+                writer.send("motion", (288 + int(200 * ((step % 20) / 10 - 1)),
+                                       200 + (step * 37) % 150))
+            writer.send("up", (560, 390))
+    return {"deal" : deal_number, "events" : writer.events}
+
+def hint_play_trace(deal_number, max_moves=300) -> dict:
+    """
+    Plays the deal by following hints with the mouse, most of the later
+    moves are drops onto the foundation.
+    """
+    game = gamelogic.solitaire(deal_number)
+    writer = trace_writer(game)
+    for x in range(max_moves):
+        move = game.hints.hint()
+        if move == None or game.state.won():
+            break
+        if engine.source(move) == engine.STOCK:
+            writer.click((32, 32))
+        else:
+            writer.drag(grab_point(game, move), drop_point(game, move))
+    return {"deal" : deal_number, "events" : writer.events}
+
+TRACE_MAKERS = {"draws" : draws_trace,
+                "long_drags" : long_drags_trace,
+                "hint_play" : hint_play_trace}
+
+def make_traces(deal_number=1):
+    os.makedirs(TRACES, exist_ok=True)
+    for name, maker in TRACE_MAKERS.items():
+        trace = maker(deal_number)
+        with open(os.path.join(TRACES, name + ".json"), "w") as trace_file:
+            json.dump(trace, trace_file, separators=(",", ":"))
+        print(f"{name}: {len(trace['events'])} events")
+
+
+#replaying
+def percentiles(samples) -> dict:
+    ordered = sorted(samples)
+    if len(ordered) == 0:
+        return {}
+    def at(fraction):
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+    return {"mean_ms" : 1000 * sum(ordered) / len(ordered),
+            "p50_ms" : 1000 * at(0.5),
+            "p90_ms" : 1000 * at(0.9),
+            "p99_ms" : 1000 * at(0.99),
+            "max_ms" : 1000 * ordered[-1]}
+
+def replay(trace, measure_memory=False) -> dict:
+    """
+    Plays every event of a trace into a fresh game, drawing a frame after
+    each one. Times each phase, or with measure_memory the bytes each phase
+    allocates, traced separately since tracing slows everything down.
+    """
+    game = gamelogic.solitaire(trace["deal"])
+    #animations see a 60 fps frame go by per event so runs can be compared
+    game.animations.clock = itertools.count(0, FRAME_MS).__next__
+    game.update_pos()
+    game.render()
+    events = [event(entry) for entry in trace["events"]]
+    phases = {"event_handler" : game.event_handler,
+              "update_pos" : lambda item: game.update_pos(),
+              "render" : lambda item: game.render()}
+    samples = {phase : [] for phase in PHASES}
+    frames = []
+    clock = time.perf_counter
+    if measure_memory:
+        tracemalloc.start()
+    started = clock()
+    for item in events:
+        frame = 0
+        for phase in PHASES:
+            if measure_memory:
+                before = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+                phases[phase](item)
+                samples[phase].append(tracemalloc.get_traced_memory()[1] - before)
+            else:
+                begun = clock()
+                phases[phase](item)
+                spent = clock() - begun
+                samples[phase].append(spent)
+                frame += spent
+        frames.append(frame)
+    elapsed = clock() - started
+    if measure_memory:
+        tracemalloc.stop()
+        return {phase : sum(samples[phase]) / max(len(samples[phase]), 1)
+                for phase in PHASES}
+    results = {"events" : len(events),
+               "events_per_second" : len(events) / max(elapsed, 1e-9),
+               "frame" : percentiles(frames)}
+    for phase in PHASES:
+        results[phase] = percentiles(samples[phase])
+    return results
+
+def animation_frames(deals=10) -> dict:
+    """
+    Frame times while every card flies to a new deal at once, the most
+    cards the animations ever move together.
+    """
+    game = gamelogic.solitaire(0)
+    game.animations.clock = itertools.count(0, FRAME_MS).__next__
+    game.update_pos()
+    game.render()
+    frames = []
+    clock = time.perf_counter
+    for number in range(1, deals + 1):
+        game.deal(number)
+        game.sync()
+        while game.animations.running():
+            started = clock()
+            game.update_pos()
+            game.render()
+            frames.append(clock() - started)
+    results = percentiles(frames)
+    results["frames"] = len(frames)
+    return results
+
+def load_trace(name) -> dict:
+    with open(os.path.join(TRACES, name + ".json")) as trace_file:
+        return json.load(trace_file)
+
+
+#time to first frame, run in a fresh interpreter each time so nothing is
+#already imported or loaded. the child reports how long pygame's own import
+#took and how long from then to the first frame being pushed
+STARTUP = """
+import time
+started = time.perf_counter()
+import pygame
+imported = time.perf_counter()
+import gamelogic
+game = gamelogic.solitaire(1)
+game.update_pos()
+game.render()
+print(imported - started, time.perf_counter() - imported, flush=True)
+"""
+
+def startup(runs=5) -> dict:
+    """median milliseconds over runs, first_frame_ms includes starting python"""
+    environment = dict(os.environ, PYGAME_HIDE_SUPPORT_PROMPT="1")
+    first_frame, pygame_import, game = [], [], []
+    for x in range(runs):
+        started = time.perf_counter()
+        child = subprocess.Popen([sys.executable, "-c", STARTUP], cwd=HERE,
+                                 env=environment, stdout=subprocess.PIPE, text=True)
+        line = child.stdout.readline()
+        first_frame.append(time.perf_counter() - started)
+        child.wait()
+        imported, ready = (float(part) for part in line.split())
+        pygame_import.append(imported)
+        game.append(ready)
+    median = lambda values: 1000 * sorted(values)[len(values) // 2]
+    return {"first_frame_ms" : median(first_frame),
+            "pygame_import_ms" : median(pygame_import),
+            "game_ms" : median(game)}
+
+
+#engine microbenchmarks, microseconds per call
+def micro(repeat=5) -> dict:
+    def best(statement, number):
+        return 1e6 * min(timeit.repeat(statement, number=number, repeat=repeat)) / number
+
+    cards = list(range(52))
+    generator = random.Random(0)
+    #positions from part way through random games to validate moves in
+    states = []
+    for seed in range(20):
+        state = engine.game(deals.deal(seed), seed)
+        for x in range(40):
+            state.apply(generator.choice(state.legal_moves()))
+        states.append(state)
+    moves = [engine.move(origin, target, count)
+             for origin in range(engine.STOCK + 1)
+             for target in range(engine.STOCK)
+             for count in (1, 2)]
+
+    def validate():
+        for state in states:
+            for move in moves:
+                state.is_legal(move)
+
+    def legal_moves():
+        for state in states:
+            state.legal_moves()
+
+    results = {"deal_us" : best(lambda: deals.deal(12345), 2000),
+               "shuffle_us" : best(lambda: deals.shuffle(cards, 99), 2000),
+               "new_game_us" : best(lambda: engine.game(deals.deal(7), 7), 1000),
+               "is_legal_us" : best(validate, 20) / (len(states) * len(moves)),
+               "legal_moves_us" : best(legal_moves, 200) / len(states)}
+    try:
+        import numpy
+    except ImportError:
+        return results
+    results["deal_batch_per_deal_us"] = best(lambda: deals.deal_batch(0, 10000), 1) / 10000
+    return results
+
+
+def run(names=None, memory=True) -> dict:
+    results = {"python" : sys.version.split()[0],
+               "pygame" : pygame.version.ver,
+               "traces" : {},
+               "micro" : micro(),
+               "animation" : animation_frames(),
+               "startup" : startup()}
+    for name in names or TRACE_MAKERS:
+        trace = load_trace(name)
+        results["traces"][name] = replay(trace)
+        if memory:
+            results["traces"][name]["allocated_bytes_per_frame"] = replay(trace, True)
+    return results
+
+def flatten(results, prefix="") -> dict:
+    values = {}
+    for key, value in results.items():
+        if type(value) == dict:
+            values.update(flatten(value, prefix + key + "."))
+        elif type(value) in (int, float):
+            values[prefix + key] = value
+    return values
+
+def compare(results, baseline) -> list:
+    """lines of every number that is in both runs with its change"""
+    now = flatten(results)
+    before = flatten(baseline)
+    lines = []
+    for key in now:
+        if key in before:
+            change = 100 * (now[key] - before[key]) / before[key] if before[key] != 0 else 0
+            lines.append(f"{key:<55} {before[key]:>12.3f} {now[key]:>12.3f} {change:>+8.1f}%")
+    return lines
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="benchmark solitaire")
+    parser.add_argument("--make-traces", action="store_true",
+                        help="write the input traces again and stop")
+    parser.add_argument("--deal", type=int, default=1,
+                        help="deal the traces are made from")
+    parser.add_argument("--trace", action="append", choices=TRACE_MAKERS,
+                        help="only replay this trace, can be given more than once")
+    parser.add_argument("--no-memory", action="store_true",
+                        help="skip the traced allocation pass")
+    parser.add_argument("--output", help="write the results to this json file")
+    parser.add_argument("--baseline", help="json results to compare against")
+    arguments = parser.parse_args()
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    if arguments.make_traces:
+        make_traces(arguments.deal)
+        sys.exit(0)
+    results = run(arguments.trace, not arguments.no_memory)
+    if arguments.output != None:
+        with open(arguments.output, "w") as output:
+            json.dump(results, output, indent=2)
+    if arguments.baseline != None:
+        with open(arguments.baseline) as baseline:
+            print("\n".join(compare(results, json.load(baseline))))
+    else:
+        print(json.dumps(results, indent=2))
+    pygame.quit()
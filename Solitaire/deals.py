@@ -0,0 +1,89 @@
+"""
+numbered deals. a deal number picks every swap of a fisher-yates shuffle
+through the splitmix64 hash, so the same number always gives the same deal
+and whole batches of deals can be made at once with numpy
+"""
+MASK = (1 << 64) - 1
+CARDS = 52
+
+
+def splitmix(value) -> int:
+    value = (value + 0x9E3779B97F4A7C15) & MASK
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & MASK
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & MASK
+    return value ^ (value >> 31)
+
+def shuffle(cards, key):
+    """
+    Shuffles cards in place. The swap for position i comes from hashing key
+    and i together so every shuffle with the same key and length matches.
+    """
+    key = key << 6 & MASK
+    for index in range(len(cards) - 1, 0, -1):
+        other = splitmix(key | index) % (index + 1)
+        cards[index], cards[other] = cards[other], cards[index]
+
+def deal(number) -> bytes:
+    """all 52 card codes in the order for deal number"""
+    cards = bytearray(range(CARDS))
+    shuffle(cards, number)
+    return bytes(cards)
+
+def order(size, number, passes) -> list:
+    """how the stock is shuffled on a given pass through deal number"""
+    positions = list(range(size))
+    shuffle(positions, splitmix(number ^ splitmix(passes)) >> 6)
+    return positions
+
+def splitmix_array(value):
+    """splitmix over a numpy uint64 array, wrapping like the masked ints above"""
+    import numpy
+
+    value = value + numpy.uint64(0x9E3779B97F4A7C15)
+    value = (value ^ (value >> numpy.uint64(30))) * numpy.uint64(0xBF58476D1CE4E5B9)
+    value = (value ^ (value >> numpy.uint64(27))) * numpy.uint64(0x94D049BB133111EB)
+    return value ^ (value >> numpy.uint64(31))
+
+def deal_batch(first, count):
+    """
+    Deals numbered first to first + count as a (count, 52) uint8 numpy
+    array, the same deals deal() gives one at a time.
+    """
+    import numpy
+
+    numbers = numpy.arange(first, first + count, dtype=numpy.uint64)
+    keys = numbers << numpy.uint64(6)
+    cards = numpy.tile(numpy.arange(CARDS, dtype=numpy.uint8), (count, 1))
+    rows = numpy.arange(count)
+    for index in range(CARDS - 1, 0, -1):
+        value = splitmix_array(keys | numpy.uint64(index))
+        other = (value % numpy.uint64(index + 1)).astype(numpy.intp)
+        swapped = cards[rows, other]
+        cards[rows, other] = cards[:, index]
+        cards[:, index] = swapped
+    return cards
+
+def order_batch(sizes, numbers, passes):
+    """
+    order() for many stocks at once. Row i of the (len(sizes), max(sizes))
+    array starts with order(sizes[i], numbers[i], passes[i]), the places
+    past each size are left as they are.
+    """
+    import numpy
+
+    sizes = numpy.asarray(sizes)
+    count = len(sizes)
+    width = int(sizes.max()) if count != 0 else 0
+    numbers = numpy.asarray(numbers).astype(numpy.uint64)
+    passes = numpy.asarray(passes).astype(numpy.uint64)
+    keys = (splitmix_array(numbers ^ splitmix_array(passes)) >> numpy.uint64(6)) << numpy.uint64(6)
+    positions = numpy.tile(numpy.arange(width), (count, 1))
+    rows = numpy.arange(count)
+    for index in range(width - 1, 0, -1):
+        shuffled = rows[sizes > index]
+        value = splitmix_array(keys[shuffled] | numpy.uint64(index))
+        other = (value % numpy.uint64(index + 1)).astype(numpy.intp)
+        swapped = positions[shuffled, other]
+        positions[shuffled, other] = positions[shuffled, index]
+        positions[shuffled, index] = swapped
+    return positions
@@ -0,0 +1,298 @@
+"""
+headless game state and rules. cards are small ints with the rank and suit
+packed together, piles are bytearrays of those ints. nothing in here needs
+pygame so it can be used for analysis without opening a window
+"""
+import deals
+
+SUITS = ["hearts", "diamonds", "spades", "clubs"]
+VALUES = ["A", "02", "03", "04", "05", "06", "07", "08", "09", "10", "J", "Q", "K"]
+
+#pile numbers used in moves
+COLUMNS = 7
+EXTRA = 7
+FOUNDATION = 8
+STOCK = 12
+
+
+#card encoding, rank in the high bits and suit in the low two bits.
+#hearts and diamonds are suits 0 and 1 so bit 1 of a card is its colour
+def card_code(suit, value) -> int:
+    return VALUES.index(value) << 2 | SUITS.index(suit)
+
+def rank(card) -> int:
+    return card >> 2
+
+def suit(card) -> int:
+    return card & 3
+
+def colour(card) -> int:
+    return card >> 1 & 1
+
+def card_name(card) -> str:
+    return "card_" + SUITS[card & 3] + "_" + VALUES[card >> 2]
+
+
+#move encoding, source pile, destination pile and number of cards moved
+def move(source, destination, count=1) -> int:
+    return source | destination << 4 | count << 8
+
+def source(move) -> int:
+    return move & 15
+
+def destination(move) -> int:
+    return move >> 4 & 15
+
+def count(move) -> int:
+    return move >> 8 & 31
+
+DRAW = move(STOCK, EXTRA)
+
+#flags added to a move in the undo records returned by game.apply
+FLIPPED = 1 << 13
+SCORED = 1 << 14
+ROTATED = 1 << 15
+RECYCLED = 1 << 16
+RECYCLED_EXTRA = 1 << 17
+
+
+def touched(record) -> list:
+    """
+    Piles a move or undo record changes. A draw is the stock and the extra
+    cards, the stock standing for the waste too, and the foundation is one
+    pile whatever the suit.
+    """
+    origin = source(record)
+    target = destination(record)
+    if origin == STOCK:
+        return [STOCK, EXTRA]
+    if target >= FOUNDATION:
+        target = FOUNDATION
+    return [origin, target]
+
+
+def can_stack(card, onto) -> bool:
+    """card can be placed on a column whose top card is onto"""
+    return colour(card) != colour(onto) and (card >> 2) + 1 == onto >> 2
+
+def can_found(card, foundation) -> bool:
+    """card can be placed on a foundation holding the given number of cards"""
+    return card >> 2 == foundation[card & 3]
+
+def safe(card, foundation) -> bool:
+    """
+    A card is safe to send to the foundation once nothing could still need
+    to be placed on it, aces and twos or when both opposite coloured cards
+    one rank lower are already on the foundation.
+    """
+    value = card >> 2
+    if value <= 1:
+        return True
+    other = 2 - (card & 2)
+    return foundation[other] >= value and foundation[other + 1] >= value
+
+class game:
+    def __init__(self, deal, seed=0):
+        """
+        deal is the 52 card codes in deck order. the columns are dealt from
+        the front of it and the rest becomes the stock, drawn from the back.
+        seed decides how the stock is reshuffled each time it runs out.
+        """
+        self.seed = seed
+        self.passes = 0
+        self.score = 0
+        self.stock = bytearray(deal)
+        self.waste = bytearray()
+        self.extra = bytearray()
+        self.columns = []
+        self.hidden = bytearray(COLUMNS)
+        self.foundation = bytearray(4)
+
+        dealt = 0
+        for column in range(COLUMNS):
+            self.columns.append(self.stock[dealt:dealt + column + 1])
+            self.hidden[column] = column
+            dealt += column + 1
+        del self.stock[:dealt]
+
+    def won(self) -> bool:
+        return len(self.stock) == 0 and len(self.waste) == 0 and len(self.extra) == 0
+
+    def legal_moves(self) -> list:
+        moves = []
+        columns = self.columns
+        if len(self.stock) != 0 or len(self.waste) != 0 or len(self.extra) != 0:
+            moves.append(DRAW)
+
+        if len(self.extra) != 0:
+            card = self.extra[-1]
+            if can_found(card, self.foundation):
+                moves.append(move(EXTRA, FOUNDATION + (card & 3)))
+            for destination in range(COLUMNS):
+                if len(columns[destination]) == 0 or \
+                   can_stack(card, columns[destination][-1]):
+                    moves.append(move(EXTRA, destination))
+
+        for origin in range(COLUMNS):
+            cards = columns[origin]
+            if len(cards) == 0:
+                continue
+            if can_found(cards[-1], self.foundation):
+                moves.append(move(origin, FOUNDATION + (cards[-1] & 3)))
+            for index in range(self.hidden[origin], len(cards)):
+                for destination in range(COLUMNS):
+                    if destination == origin:
+                        continue
+                    if len(columns[destination]) == 0 or \
+                       can_stack(cards[index], columns[destination][-1]):
+                        moves.append(move(origin, destination, len(cards) - index))
+        return moves
+
+    def is_legal(self, move) -> bool:
+        origin = move & 15
+        target = move >> 4 & 15
+        moved = move >> 8
+        if origin == STOCK:
+            return move == DRAW and (len(self.stock) != 0 or
+                                     len(self.waste) != 0 or len(self.extra) != 0)
+        if origin == EXTRA:
+            if moved != 1 or len(self.extra) == 0:
+                return False
+            card = self.extra[-1]
+        elif origin < COLUMNS:
+            cards = self.columns[origin]
+            if moved < 1 or moved > len(cards) - self.hidden[origin]:
+                return False
+            card = cards[-moved]
+        else:
+            return False
+
+        if target >= FOUNDATION and target < STOCK:
+            return moved == 1 and target - FOUNDATION == card & 3 and \
+                   can_found(card, self.foundation)
+        if target < COLUMNS and target != origin:
+            cards = self.columns[target]
+            return len(cards) == 0 or can_stack(card, cards[-1])
+        return False
+
+    def apply(self, move) -> int:
+        """
+        Applies a legal move, see is_legal. Returns an undo record, the move
+        with flags for anything else that changed, which undo reverses.
+        """
+        origin = move & 15
+        target = move >> 4 & 15
+        moved = move >> 8
+        if origin == STOCK:
+            return move | self.draw()
+
+        record = move
+        if origin == EXTRA:
+            cards = self.extra[-1:]
+            del self.extra[-1]
+        else:
+            cards = self.columns[origin][-moved:]
+            del self.columns[origin][-moved:]
+            #flip the new top card of the column
+            if self.hidden[origin] != 0 and \
+               self.hidden[origin] == len(self.columns[origin]):
+                self.hidden[origin] -= 1
+                record |= FLIPPED
+
+        if target >= FOUNDATION:
+            self.foundation[target - FOUNDATION] += 1
+        else:
+            if len(self.columns[target]) != 0:
+                self.score += 1
+                record |= SCORED
+            self.columns[target] += cards
+        return record
+
+    def undo(self, record):
+        origin = record & 15
+        target = record >> 4 & 15
+        moved = record >> 8 & 31
+        if origin == STOCK:
+            self.undraw(record)
+            return
+
+        if target >= FOUNDATION:
+            self.foundation[target - FOUNDATION] -= 1
+            cards = bytes([self.foundation[target - FOUNDATION] << 2 |
+                           target - FOUNDATION])
+        else:
+            cards = self.columns[target][-moved:]
+            del self.columns[target][-moved:]
+            if record & SCORED:
+                self.score -= 1
+
+        if origin == EXTRA:
+            self.extra += cards
+        else:
+            if record & FLIPPED:
+                self.hidden[origin] += 1
+            self.columns[origin] += cards
+
+    def draw(self) -> int:
+        """
+        Turns the top stock card over onto the extra cards. Once three extra
+        cards are showing they go to the waste first, and when the stock runs
+        out the waste (and extra cards) are shuffled back into it. Returns the
+        undo flags for the draw.
+        """
+        flags = 0
+        if len(self.stock) == 0:
+            if len(self.waste) == 0:
+                if len(self.extra) == 0:
+                    return flags
+                flags = RECYCLED_EXTRA
+                self.recycle(self.extra)
+            elif len(self.extra) < 3:
+                flags = RECYCLED
+                self.recycle(self.waste)
+            else:
+                flags = RECYCLED | RECYCLED_EXTRA
+                self.recycle(self.waste, self.extra)
+        elif len(self.extra) >= 3:
+            flags = ROTATED
+            self.waste += self.extra
+            self.extra.clear()
+        self.extra.append(self.stock.pop())
+        self.score += 1
+        return flags
+
+    def undraw(self, record):
+        self.stock.append(self.extra.pop())
+        self.score -= 1
+        if record & ROTATED:
+            self.extra[:] = self.waste[-3:]
+            del self.waste[-3:]
+        elif record & (RECYCLED | RECYCLED_EXTRA):
+            self.passes -= 1
+            order = self.pass_order(len(self.stock))
+            cards = bytearray(len(self.stock))
+            for index in range(len(order)):
+                cards[order[index]] = self.stock[index]
+            self.stock.clear()
+            if record & RECYCLED_EXTRA and record & RECYCLED:
+                self.waste[:] = cards[:-3]
+                self.extra[:] = cards[-3:]
+            elif record & RECYCLED:
+                self.waste[:] = cards
+            else:
+                self.extra[:] = cards
+
+    def recycle(self, *piles):
+        for pile in piles:
+            self.stock += pile
+            pile.clear()
+        order = self.pass_order(len(self.stock))
+        self.stock[:] = bytes(self.stock[index] for index in order)
+        self.passes += 1
+
+    def pass_order(self, size) -> list:
+        """
+        The shuffle used when the stock is rebuilt on the current pass. Each
+        pass has its own so a game replays the same way and can be undone.
+        """
+        return deals.order(size, self.seed, self.passes)
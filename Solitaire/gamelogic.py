@@ -4,45 +4,98 @@ for game over states, opens initial window
 """
 import pygame
 import gameobject
-import csv
+import animation
+import autoplay
+import engine
+import deals
+import moveindex
+import journal
+import gamerecord
+import scheduler
+import scaling
+import argparse
 import random
 
+class hit_index:
+    """
+    Grid over the window where each cell lists the components whose region
+    overlaps it, so a click is only tested against the regions under it.
+    """
+    def __init__(self, cell=64):
+        self.cell = cell
+        self.cells = {}
+
+    def add(self, component):
+        region = component.region
+        for x in range(region.left // self.cell, (region.right - 1) // self.cell + 1):
+            for y in range(region.top // self.cell, (region.bottom - 1) // self.cell + 1):
+                self.cells.setdefault((x, y), []).append(component)
+
+    def at(self, pos) -> list:
+        candidates = self.cells.get((pos[0] // self.cell, pos[1] // self.cell), [])
+        return [component for component in candidates
+                if component.region.collidepoint(pos)]
+
+
+#every pile shown on screen, the stock stands for the waste as well
+PILES = list(range(engine.COLUMNS)) + [engine.EXTRA, engine.FOUNDATION, engine.STOCK]
+
 class solitaire:
-    def __init__(self):
-        #initialise game engine and create a window
-        pygame.init()
-        self.game_window = pygame.display.set_mode((576, 400))
+    def __init__(self, deal_number=None, window_size=None):
+        #initialise only the parts of pygame the game uses and create a
+        #window. given a size the window can be resized and the game is
+        #drawn scaled to fit it
+        pygame.display.init()
         pygame.font.init()
-        self.font = pygame.font.SysFont("Arial", 24)
+        if window_size == None:
+            self.game_window = pygame.display.set_mode(scaling.LAYOUT)
+            self.scaled = False
+        else:
+            window = pygame.display.set_mode(window_size, pygame.RESIZABLE)
+            self.game_window = scaling.scaled_window(window)
+            self.scaled = True
+        #pygame's own font, looking up a system font means a font scan
+        self.font = pygame.font.Font(None, 30)
 
         #generate and collect the game objects
         self.deck = []
-        self.values = ["A","02","03","04","05","06","07","08","09","10","J","Q","K"]
         self.discard_pile = []
         self.generate_cards()
-        self.shuffle(self.deck)
-        self.components = {"board" : gameobject.board(),
+        self.animations = animation.animator(self.cards)
+        self.deal(deal_number)
+        self.components = {"board" : gameobject.board(self.game_window.get_size()),
                            "draw_zone" : gameobject.draw_zone(self.deck),
                            "extra_cards" : gameobject.extra_cards(),
-                           "column_1" : gameobject.column(1, self.deck),
-                           "column_2" : gameobject.column(2, self.deck),
-                           "column_3" : gameobject.column(3, self.deck),
-                           "column_4" : gameobject.column(4, self.deck),
-                           "column_5" : gameobject.column(5, self.deck),
-                           "column_6" : gameobject.column(6, self.deck),
-                           "column_7" : gameobject.column(7, self.deck),
+                           "column_1" : gameobject.column(1),
+                           "column_2" : gameobject.column(2),
+                           "column_3" : gameobject.column(3),
+                           "column_4" : gameobject.column(4),
+                           "column_5" : gameobject.column(5),
+                           "column_6" : gameobject.column(6),
+                           "column_7" : gameobject.column(7),
                            "foundation" : gameobject.foundation(),
+                           "animations" : self.animations,
+                           "hint" : gameobject.hint_marker(),
                            "moving_cards" : gameobject.moving_cards(),
                            "new_game_button" : gameobject.new_game_button(),
                            "score" : gameobject.score(self.font),
-                           "game_win" : gameobject.game_win_message(self.font)}
+                           "game_win" : gameobject.game_win_message(self.font),
+                           "keyboard" : gameobject.keyboard()}
 
         #stored function calls for game events used in event_handler
         self.events = {"draw_card" : self.draw_card,
                        "move_cards" : self.move_cards,
+                       "drag_cards" : self.drag_cards,
                        "place_cards" : self.place_cards,
                        "return_cards" : self.return_cards,
-                       "reset" : self.reset_game}
+                       "reset" : self.reset_game,
+                       "show_hint" : self.show_hint,
+                       "undo" : self.undo,
+                       "redo" : self.redo,
+                       "auto_play" : self.toggle_auto_play,
+                       "save" : self.save_game,
+                       "profile" : self.toggle_profiler,
+                       "export_profile" : self.export_profile}
 
         #collection of gameobjects with considering_move attribute
         #used in place_cards
@@ -55,24 +108,87 @@ class solitaire:
                          "column_6",
                          "column_7",]
 
+        #components listening to each event type. ones with a region are
+        #found through a hit index, the rest get every event of the type
+        self.listeners = {}
+        self.hits = {}
+        for component in self.components.values():
+            for event_type in component.events:
+                if component.region == None:
+                    self.listeners.setdefault(event_type, []).append(component)
+                else:
+                    self.hits.setdefault(event_type, hit_index()).add(component)
+        #safe cards go to the foundation on their own after each move
+        self.auto_play = False
+        #made the first time it's switched on
+        self.profiler = None
+        self.sync()
 
     #functions that handle user interface
     def render(self):
+        """
+        Collects the rects each component invalidated since the last frame,
+        redraws every component clipped to those areas and only pushes the
+        changed areas to the display.
+        """
+        dirty = []
         for component in self.components.values():
-            component.render(self.game_window)
-        pygame.display.update()
+            for rect in component.invalidated():
+                #merge overlapping areas so nothing is drawn twice
+                overlap = rect.collidelist(dirty)
+                while overlap != -1:
+                    rect = rect.union(dirty.pop(overlap))
+                    overlap = rect.collidelist(dirty)
+                dirty.append(rect)
+        if len(dirty) == 0:
+            return
+        for area in dirty:
+            self.game_window.set_clip(area)
+            for component in self.components.values():
+                component.render(self.game_window)
+        self.game_window.set_clip(None)
+        if self.scaled:
+            self.game_window.update(dirty)
+        else:
+            pygame.display.update(dirty)
+
+    def window_event(self, event) -> pygame.event.Event:
+        """
+        Handles the window being resized and moves mouse positions into the
+        game's layout when it is drawn scaled.
+        """
+        if not self.scaled:
+            return event
+        if event.type == pygame.VIDEORESIZE:
+            self.game_window.resize(pygame.display.get_surface())
+            #everything is drawn again at the new scale
+            self.components["board"].drawn_state = None
+        return self.game_window.event(event)
 
     def update_pos(self):
         for component in self.components.values():
             component.update_pos()
 
+    def busy(self) -> bool:
+        """
+        True while something on screen moves between inputs, or while the
+        profiler is on so its frame rate means something.
+        """
+        return self.dragging() or self.animations.running() or \
+               (self.profiler != None and self.profiler.enabled)
+
     def event_handler(self, event):
         """
         Calls game object event handle function which returns a list. The
         first element in the list is the method to be called from self.events
-        and the remaining elements are the arguments for the function.
+        and the remaining elements are the arguments for the function. Only
+        components listening to the event type are called, and for clicks
+        only the ones under the mouse.
         """
-        for component in self.components.values():
+        candidates = []
+        if event.type in self.hits:
+            candidates = self.hits[event.type].at(event.pos)
+        for component in candidates + self.listeners.get(event.type, []):
             event_response = component.event_listener(event)
             if event_response != None:
                 action = event_response.pop(0)
@@ -83,74 +199,183 @@ class solitaire:
                     self.events[action]()
                 return
 
-    def increment_score(self):
-       self.components["score"].value += 1
-
     #functions that handle deck/discard interaction
     def generate_cards(self):
-        with open("_cards.csv", newline='') as csvfile:
-            filereader = csv.reader(csvfile)
-            for row in filereader:
-                self.deck.append(gameobject.card(''.join(row)))
-
-    def shuffle(self, cards: list):
-        shuffler = []
-        to_shuffle = len(cards)
-        while len(shuffler) != to_shuffle:
-            shuffler.append(cards.pop(random.randint(0, len(cards) - 1)))
-        for card in range(len(shuffler)):
-            cards.append(shuffler[card])
+        """
+        Makes the card objects indexed by their engine code, the piles shown
+        on screen are built from these.
+        """
+        self.cards = [gameobject.card(code) for code in range(52)]
 
-    def draw_card(self):
-        in_deck = len(self.deck)
-        in_discard = len(self.discard_pile)
-        in_extra = len(self.components["extra_cards"].cards)
-
-        if in_deck == 0:
-            if in_discard == 0:
-                if in_extra == 0:
-                    return
-                else:
-                    self.combine_piles(self.components["extra_cards"].cards)
-                    self.components["extra_cards"].cards.append(self.deck.pop(-1))
-            elif in_extra < 3:
-                self.combine_piles(self.discard_pile)
-                self.components["extra_cards"].cards.append(self.deck.pop(-1))
-            else:
-                self.combine_piles(self.discard_pile, self.components["extra_cards"].cards)
-                self.components["extra_cards"].cards.append(self.deck.pop(-1))
-        elif in_extra < 3:
-            self.components["extra_cards"].cards.append(self.deck.pop(-1))
-        else:
-            self.discard_pile.extend(self.components["extra_cards"].cards)
-            self.components["extra_cards"].cards.clear()
-            self.components["extra_cards"].cards.append(self.deck.pop(-1))
-        self.increment_score()
+    def deal(self, number=None):
+        """
+        Starts deal number, or a random one. The same number always gives
+        the same game.
+        """
+        if number == None:
+            number = random.getrandbits(32)
+        self.deal_number = number
+        self.state = engine.game(deals.deal(number), number)
+        self.hints = moveindex.move_index(self.state)
+        self.journal = journal.journal()
+        pygame.display.set_caption(f"Solitaire - deal {number}")
 
-    def combine_piles(self, *piles):
+    def sync(self, piles=PILES):
+        """
+        Rebuilds piles on screen from the engine state, the components only
+        hold card objects for drawing and picking up cards. Only the piles
+        given are rebuilt and marked changed, everything else keeps its
+        layout. Cards that end up somewhere else fly there.
+        """
+        state = self.state
+        animations = self.animations
         for pile in piles:
-            self.deck.extend(pile)
-            pile.clear()
-        self.shuffle(self.deck)
-            
-        
+            if pile == engine.STOCK:
+                draw_zone = self.components["draw_zone"]
+                self.deck[:] = [self.cards[code] for code in state.stock]
+                self.discard_pile[:] = [self.cards[code] for code in state.waste]
+                animations.depart(self.deck, draw_zone)
+                for card in self.deck + self.discard_pile:
+                    card.visibility = False
+                draw_zone.changed()
+            elif pile == engine.EXTRA:
+                extra_cards = self.components["extra_cards"]
+                extra_cards.cards[:] = [self.cards[code] for code in state.extra]
+                animations.depart(extra_cards.cards, extra_cards)
+                for card in extra_cards.cards:
+                    card.visibility = True
+                extra_cards.changed()
+            elif pile == engine.FOUNDATION:
+                foundation = self.components["foundation"]
+                for suit in range(4):
+                    cards = foundation.cards[engine.SUITS[suit]]
+                    cards[:] = [self.cards[value << 2 | suit]
+                                for value in range(state.foundation[suit])]
+                    animations.depart(cards, foundation)
+                    for card in cards:
+                        card.visibility = True
+                foundation.changed()
+            else:
+                column = self.components["column_" + str(pile + 1)]
+                column.cards[:] = [self.cards[code] for code in state.columns[pile]]
+                animations.depart(column.cards, column)
+                for index in range(len(column.cards)):
+                    column.cards[index].visibility = index >= state.hidden[pile]
+                column.changed()
+
+        self.components["moving_cards"].cards.clear()
+        self.components["moving_cards"].changed()
+        for game_object in self.movables:
+            self.components[game_object].considering_move = False
+        self.components["score"].value = state.score
+        self.components["hint"].clear()
+
+    def play(self, move, auto=True) -> int:
+        """
+        Applies a legal move to the engine, updates the move index and the
+        piles on screen, and says so when no moves are left. auto False
+        leaves out put_away, for replaying journalled moves that already
+        hold the cards it sent.
+        """
+        record = self.state.apply(move)
+        self.journal.record(record)
+        self.moved(record)
+        if auto:
+            self.put_away()
+        return record
+
+    def moved(self, record):
+        self.hints.moved(record)
+        self.sync(engine.touched(record))
+        self.check_dead_end()
+
+    def put_away(self):
+        """
+        Sends cards to the foundation the player no longer has to, safe
+        cards when auto play is on and every card once the game is only a
+        matter of putting the columns away. They are journalled one by one
+        so undo takes them back a card at a time, and set off one after
+        another in the order they were played.
+        """
+        records = autoplay.safe_moves(self.state) if self.auto_play else []
+        records += autoplay.complete(self.state)
+        if len(records) == 0:
+            return
+        foundation = self.components["foundation"]
+        piles = {engine.FOUNDATION}
+        #the foundation is walked back down to find the card each one sent
+        height = bytearray(self.state.foundation)
+        for index in range(len(records) - 1, -1, -1):
+            suit = engine.destination(records[index]) - engine.FOUNDATION
+            height[suit] -= 1
+            self.animations.depart([self.cards[height[suit] << 2 | suit]], foundation,
+                                   index * animation.CASCADE)
+            piles.add(engine.source(records[index]))
+        for record in records:
+            self.journal.record(record)
+            self.hints.moved(record)
+        self.sync(sorted(piles))
+        self.check_dead_end()
+
+    def check_dead_end(self):
+        dead_end = self.hints.dead_end()
+        if dead_end:
+            self.components["game_win"].message = "No moves left"
+        self.components["game_win"].visibility = dead_end
+
+    def dragging(self) -> bool:
+        return len(self.components["moving_cards"].cards) != 0
+
+    def undo(self):
+        #the dragged cards are still counted in the pile they came from
+        if self.dragging():
+            return
+        record = self.journal.undo(self.state)
+        if record != None:
+            self.moved(record)
+
+    def redo(self):
+        if self.dragging():
+            return
+        record = self.journal.redo(self.state)
+        if record != None:
+            self.moved(record)
+
+    def toggle_auto_play(self):
+        self.auto_play = not self.auto_play
+        #with cards dragged it waits until they are put down
+        if self.auto_play and not self.dragging():
+            self.put_away()
+
+    def draw_card(self):
+        #a draw would clear the dragged cards without rebuilding their pile
+        if self.dragging():
+            return
+        if self.state.is_legal(engine.DRAW):
+            self.play(engine.DRAW)
+
+
     #functions that handle moving cards
     def move_cards(self, to_move):
-        if type(to_move) == list:
-            for card in to_move:
-                self.components["moving_cards"].cards.append(card)
-        else:
-            self.components["moving_cards"].cards.append(to_move)
-                
-            
+        if type(to_move) != list:
+            to_move = [to_move]
+        #cards picked up mid flight are put in their place first
+        self.animations.stop(to_move)
+        for card in to_move:
+            self.components["moving_cards"].cards.append(card)
+        self.components["moving_cards"].changed()
+        self.components["hint"].clear()
+
+    def drag_cards(self, rel):
+        self.animations.follow(self.components["moving_cards"], rel)
+
+
     def place_cards(self, destination):
         if len(self.components["moving_cards"].cards) == 0:
             return
         else:
             if "column" in destination:
                 if self.check_valid_column_move(destination):
-                    if len(self.components[destination].cards) != 0:
-                        self.increment_score()
                     self.column_move(destination)
                 else:
                     self.return_cards()
@@ -159,66 +384,88 @@ class solitaire:
                     self.foundation_move(destination)
                 else:
                     self.return_cards()
-                    
-    def check_valid_foundation_move(self, destination) -> bool:
-        candidates = self.components["moving_cards"].cards
-        if candidates[-1].suit == destination:
-            if len(self.components["foundation"].cards.get(destination)) == 0:
-                if candidates[-1].value == "A":
-                    return True
-            else:
-                candidate_index = self.values.index(candidates[-1].value)
-                required_index = self.values.index(
-                self.components["foundation"].cards.get(destination)[-1].value) + 1
-                if candidate_index == required_index:
-                    return True
-        return False
 
-    def foundation_move(self, destination):
-        card_to_place = self.components["moving_cards"].cards.pop(-1)
-        self.components["foundation"].cards.get(destination).append(card_to_place)
+    def origin(self) -> int:
+        """engine pile the moving cards were picked up from"""
         for game_object in self.movables:
             if self.components[game_object].considering_move:
-                self.components[game_object].cards.extend(
-                    self.components["moving_cards"].cards)
-                self.components["moving_cards"].cards.clear()
-                self.components[game_object].considering_move = False
-                return
-    
+                origin = game_object
+        if origin == "extra_cards":
+            return engine.EXTRA
+        return int(origin[-1]) - 1
+
+    def pending_move(self, destination) -> int:
+        """engine move for dropping the moving cards on destination"""
+        origin = self.origin()
+        if "column" in destination:
+            return engine.move(origin, int(destination[-1]) - 1,
+                               len(self.components["moving_cards"].cards))
+        #only the last card of a stack goes onto the foundation
+        return engine.move(origin, engine.FOUNDATION + engine.SUITS.index(destination))
+
+    def check_valid_foundation_move(self, destination) -> bool:
+        return self.state.is_legal(self.pending_move(destination))
+
+    def foundation_move(self, destination):
+        self.play(self.pending_move(destination))
+
     def check_valid_column_move(self, destination) -> bool:
-        candidates = self.components["moving_cards"].cards
-        if len(self.components[destination].cards) == 0:
-            return True
-        elif candidates[0].colour != self.components[destination].cards[-1].colour:
-            candidate_index = self.values.index(candidates[0].value)
-            required_index = self.values.index(self.components[destination].cards[-1].value) - 1
-            if candidate_index == required_index:
-                return True
-        return False
+        return self.state.is_legal(self.pending_move(destination))
 
     def column_move(self, destination):
-        self.components.get(destination).cards.extend\
-                                        (self.components["moving_cards"].cards)
-        self.components["moving_cards"].cards.clear()
-        for game_object in self.movables:
-            if self.components[game_object].considering_move:
-                self.components[game_object].considering_move = False
-                return           
+        self.play(self.pending_move(destination))
 
     def return_cards(self):
-        for game_object in self.movables:
-            if self.components[game_object].considering_move:
-                self.components[game_object].cards.extend\
-                                            (self.components["moving_cards"].cards)
-                self.components["moving_cards"].cards.clear()
-                self.components[game_object].considering_move = False
-                return
+        self.sync([self.origin()])
+        #auto play may have been switched on during the drag
+        if self.auto_play:
+            self.put_away()
+
+    def save_game(self, path="games.sol"):
+        """adds the game so far to an archive of game records"""
+        gamerecord.save(path, self.deal_number, self.journal.moves())
+
+    def toggle_profiler(self):
+        if self.profiler == None:
+            #imported here so starting without it doesn't pay for it
+            import profiler
+            self.profiler = profiler.profiler(self)
+        self.profiler.toggle()
+
+    def export_profile(self, path="profile.json"):
+        """writes what the profiler collected as a chrome trace"""
+        if self.profiler != None:
+            self.profiler.export(path)
+
+    def show_hint(self):
+        """outlines the cards and the place for the most useful move"""
+        move = self.hints.hint()
+        if move == None:
+            return
+        marker = self.components["hint"]
+        origin = engine.source(move)
+        target = engine.destination(move)
+        if origin == engine.STOCK:
+            marker.show([self.components["draw_zone"]], [])
+            return
+        if origin == engine.EXTRA:
+            cards = self.components["extra_cards"].cards[-1:]
+        else:
+            cards = self.components["column_" + str(origin + 1)].cards
+            cards = cards[len(cards) - engine.count(move):]
+        if target >= engine.FOUNDATION:
+            place = self.components["foundation"].positions[engine.SUITS[target - engine.FOUNDATION]]
+        else:
+            column = self.components["column_" + str(target + 1)]
+            if len(column.cards) != 0:
+                place = column.cards[-1].position
+            else:
+                place = pygame.Rect(column.left, 64, 64, 64)
+        marker.show(cards, [place])
 
     #functions that handle winning the game
     def check_win(self) -> bool:
-        if len(self.deck) == 0 and \
-           len(self.discard_pile) == 0 and \
-           len(self.components["extra_cards"].cards) == 0:
+        if self.state.won():
             for game_object in self.movables:
                 if self.components[game_object].considering_move == True:
                     return False
@@ -226,6 +473,7 @@ class solitaire:
         return False
 
     def win(self):
+        self.components["game_win"].message = "You Win!"
         self.components["game_win"].visibility = True
 
     #functions that handle resetting the game
@@ -235,39 +483,49 @@ class solitaire:
             action = response.pop(0)
             self.events[action]()
             return True
-        
+
     def reset_game(self):
-        self.combine_piles(self.discard_pile,
-                           self.components["extra_cards"].cards,
-                           self.components["column_1"].cards,
-                           self.components["column_2"].cards,
-                           self.components["column_3"].cards,
-                           self.components["column_4"].cards,
-                           self.components["column_5"].cards,
-                           self.components["column_6"].cards,
-                           self.components["column_7"].cards,
-                           self.components["foundation"].cards["hearts"],
-                           self.components["foundation"].cards["diamonds"],
-                           self.components["foundation"].cards["spades"],
-                           self.components["foundation"].cards["clubs"])        
-        self.shuffle(self.deck)
-        for cards in self.deck:
-            cards.visibility = False
-            cards.position = None
-        for game_object in self.components:
-            if "column" in game_object:
-                self.components[game_object].setup()
-        self.components["score"].value = 0
+        self.deal()
+        self.sync()
         self.components["game_win"].visibility = False
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="play solitaire")
+    parser.add_argument("deal", type=int, nargs="?", default=None)
+    parser.add_argument("--fps", type=int, default=60,
+                        help="frame rate cap while dragging cards")
+    parser.add_argument("--power", choices=scheduler.POLICIES, default="balanced",
+                        help="balanced sleeps until input when idle, saver also "
+                             "halves the frame rate, performance never sleeps")
+    parser.add_argument("--profile", action="store_true",
+                        help="start with the profiler on, f3 toggles it and "
+                             "f4 writes profile.json")
+    parser.add_argument("--size", help="open a resizable window of this size, "
+                                       "like 1152x800, with the game scaled to fit")
+    parser.add_argument("--no-animation", action="store_true",
+                        help="put cards straight in their place")
+    parser.add_argument("--auto-play", action="store_true",
+                        help="send safe cards to the foundation after each move, "
+                             "a toggles it")
+    arguments = parser.parse_args()
+
     running = True
     game_over = False
-    game = solitaire()
+    size = None
+    if arguments.size != None:
+        size = tuple(int(part) for part in arguments.size.lower().split("x"))
+    game = solitaire(arguments.deal, size)
+    game.animations.enabled = not arguments.no_animation
+    if arguments.auto_play:
+        game.toggle_auto_play()
+    frames = scheduler.scheduler(arguments.fps, arguments.power)
+    if arguments.profile:
+        game.toggle_profiler()
+    game.update_pos()
+    game.render()
     while running:
-            game.update_pos()
-            game.render()
-            for event in pygame.event.get():
+            for event in frames.events(game.busy()):
+                event = game.window_event(event)
                 if event.type == pygame.QUIT:
                     running = False
                 elif game.check_win() and game_over == False:
@@ -278,9 +536,7 @@ if __name__ == "__main__":
                 else:
                     if game.check_reset(event) and game_over:
                         game_over = False
-                    
-    pygame.quit()
+            game.update_pos()
+            game.render()
 
-    
-        
-        
+    pygame.quit()
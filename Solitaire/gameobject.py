@@ -1,17 +1,35 @@
 """
 every object needs to be able to:
 - handle events. events return list containing action plus arguments for reaction
+- list the event types it listens to, and the region it can be clicked in
+  if it only cares about clicks on itself
 - update the status of it's attributes
 - render attributes
 
 
 """
 import pygame
+import assets
+import engine
 
 class game_object:
+    #event types passed to event_listener
+    events = ()
+    #area mouse events must land in, None to get every event of its types
+    region = None
+
+    #what was on screen the last time invalidated was called
+    drawn_state = None
+    drawn_rects = []
+
+    #bumped by whatever changes the cards an object holds, layout and
+    #redrawing only happen for objects whose version moved on
+    version = 0
+    laid_out = None
+
     def __init__():
         pass
-    
+
     def event_listener(self, event) -> list:
         pass
 
@@ -21,108 +39,183 @@ class game_object:
     def render(self, draw_surface):
         pass
 
+    def invalidated(self) -> list:
+        return []
+
+    def changed(self):
+        self.version += 1
+
+    def track(self, state, rects) -> list:
+        """
+        Compares state with what was drawn last time. If it changed, returns
+        the rects covered before and after the change so both get redrawn.
+        """
+        if state == self.drawn_state:
+            return []
+        changed = self.drawn_rects + rects
+        self.drawn_state = state
+        self.drawn_rects = rects
+        return changed
+
+    def track_cards(self, cards) -> list:
+        if self.version == self.drawn_state:
+            return []
+        if len(cards) == 0:
+            return self.track(self.version, [])
+        rects = [card.position for card in cards]
+        return self.track(self.version, [rects[0].unionall(rects[1:])])
+
 
 class board(game_object):
-    def __init__(self):
+    def __init__(self, size):
         self.colour = (59, 108, 59)
+        self.position = pygame.Rect((0, 0), size)
+        self.rects = [self.position]
+        self.background = None
+
+    def invalidated(self) -> list:
+        return self.track(self.colour, self.rects)
 
     def render(self, draw_surface):
-        draw_surface.fill(self.colour)
+        #restore only the area being redrawn from the cached background
+        if self.background == None:
+            self.background = pygame.Surface(self.position.size).convert()
+            self.background.fill(self.colour)
+        area = draw_surface.get_clip()
+        draw_surface.blit(self.background, area, area)
 
 
 class draw_zone(game_object):
+    events = (pygame.MOUSEBUTTONDOWN,)
+
     def __init__(self, deck):
         self.deck = deck
         self.empty_deck = False
         self.position = pygame.Rect(0,0,64,64)
-        self.assets = ["assets\\card_back.png", "assets\\deck_empty.png"]
+        self.region = self.position
+        self.rects = [self.position]
+        self.assets = ["card_back", "deck_empty"]
 
     def event_listener(self, event) -> list:
         if event.type == pygame.MOUSEBUTTONDOWN:
-            if self.position.collidepoint(event.pos):
-                return ["draw_card"]
+            return ["draw_card"]
+
+    def update_pos(self):
+        #cards going back to the stock land here
+        if self.laid_out == self.version:
+            return
+        self.laid_out = self.version
+        for card in self.deck:
+            card.position.update(self.position)
+
+    def invalidated(self) -> list:
+        return self.track(len(self.deck) != 0, self.rects)
 
     def render(self, draw_surface):
         if len(self.deck) != 0:
-            draw_surface.blit(pygame.image.load(self.assets[0]), self.position)
+            draw_surface.blit(assets.get(self.assets[0]), self.position)
         else:
-            draw_surface.blit(pygame.image.load(self.assets[1]), self.position)
+            draw_surface.blit(assets.get(self.assets[1]), self.position)
 
 
 class extra_cards(game_object):
+    events = (pygame.MOUSEBUTTONDOWN,)
+
     def __init__(self):
         self.cards = []
         self.considering_move = False
+        self.region = pygame.Rect(0, 74, 64, 104)
 
     def event_listener(self, event):
         if event.type == pygame.MOUSEBUTTONDOWN:
-            if len(self.cards) != 0 and self.cards[-1].position.collidepoint(event.pos):
+            #the top card's place, it may still be flying there
+            top = 74 + (len(self.cards) - 1) * 20
+            if len(self.cards) != 0 and top <= event.pos[1] < top + 64:
                 self.considering_move = True
+                self.changed()
                 return["move_cards", self.cards.pop(-1)]
 
     def update_pos(self):
-        for card_index in range(len(self.cards)):
-            self.cards[card_index].position = pygame.Rect(0, 74 + card_index * 20, 64, 64 )
-            self.cards[card_index].visibility = True
+        if self.laid_out == self.version:
+            return
+        self.laid_out = self.version
+        for index, card in enumerate(self.cards):
+            card.position.update(0, 74 + index * 20, 64, 64)
+
+    def invalidated(self) -> list:
+        return self.track_cards(self.cards)
 
     def render(self, draw_surface):
+        #flying cards are drawn over everything by the animations
+        if not draw_surface.get_clip().colliderect(self.region):
+            return
         for card in self.cards:
-            draw_surface.blit(pygame.image.load(card.get_asset()), card.position)
+            if not card.flying:
+                card.render(draw_surface)
 
 
 class column(game_object):
-    def __init__(self, setup_value, deck):
-        self.deck = deck
+    events = (pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP)
+
+    def __init__(self, setup_value):
         self.column_ID = str("column_" + str(setup_value))
         self.left = 64 * setup_value
         self.position = pygame.Rect(self.left, 64, 64, 400)
-        self.initial_cards = setup_value
+        self.region = self.position
         self.cards = []
         self.considering_move = False
-        self.setup()
-        
+
+    def card_at(self, y) -> int:
+        """
+        Index of the card at height y. Cards overlap every 20 pixels so it
+        is worked out directly, the top card shows all 64 pixels.
+        """
+        index = (y - 64) // 20
+        if index < len(self.cards):
+            return index
+        if y < 64 + (len(self.cards) - 1) * 20 + 64:
+            return len(self.cards) - 1
+        return None
+
     def event_listener(self, event):
         if event.type == pygame.MOUSEBUTTONUP:
-            if self.position.collidepoint(event.pos):
-                return ["place_cards", self.column_ID]
+            return ["place_cards", self.column_ID]
         elif event.type == pygame.MOUSEBUTTONDOWN:
             if len(self.cards) == 0:
                 return
-            else:
-                for card in self.cards:
-                    if card.position.collidepoint(event.pos) and \
-                       card.visibility == True:
-                        index = self.cards.index(card)
-                        to_move = []
-                        while len(self.cards) != index:
-                            to_move.insert(0, self.cards.pop(-1))
-                        self.considering_move = True
-                        return["move_cards", to_move]
+            index = self.card_at(event.pos[1])
+            if index != None and self.cards[index].visibility == True:
+                to_move = self.cards[index:]
+                del self.cards[index:]
+                self.considering_move = True
+                self.changed()
+                return["move_cards", to_move]
 
     def update_pos(self):
-        if len(self.cards) == 0:
+        #cards keep their rects, they are only moved when the pile changed
+        if self.laid_out == self.version:
             return
-        for x in range(len(self.cards)):
-            if x == len(self.cards) - 1:
-                self.cards[x].position = pygame.Rect(self.left, 64 + x * 20, 64, 64)
-            else:
-                self.cards[x].position = pygame.Rect(self.left, 64 + x * 20, 64, 20)
-        if not self.considering_move:
-            self.cards[-1].visibility = True
-                       
+        self.laid_out = self.version
+        last = len(self.cards) - 1
+        for index, card in enumerate(self.cards):
+            card.position.update(self.left, 64 + index * 20, 64,
+                                 64 if index == last else 20)
+
+    def invalidated(self) -> list:
+        return self.track_cards(self.cards)
+
     def render(self, draw_surface):
+        #flying cards are drawn over everything by the animations
+        if not draw_surface.get_clip().colliderect(self.position):
+            return
         for card in self.cards:
-            draw_surface.blit(pygame.image.load(card.get_asset()), card.position)
-            
+            if not card.flying:
+                card.render(draw_surface)
 
-    def setup(self):
-        for x in range(self.initial_cards):
-            self.cards.append(self.deck.pop(0))
-            if x == self.initial_cards - 1:
-                self.cards[-1].visibility = True
-            
 
 class foundation(game_object):
+    events = (pygame.MOUSEBUTTONUP,)
+
     def __init__(self):
         self.cards = {"hearts" : [],
                       "diamonds" : [],
@@ -132,6 +225,8 @@ class foundation(game_object):
                           "diamonds" : pygame.Rect(512, 112, 64, 64),
                           "spades" : pygame.Rect(512, 208, 64, 64),
                           "clubs" : pygame.Rect(512, 304, 64, 64)}
+        self.region = pygame.Rect(512, 16, 64, 352)
+        self.drawn_version = None
 
     def event_listener(self, event):
         if event.type == pygame.MOUSEBUTTONUP:
@@ -139,49 +234,86 @@ class foundation(game_object):
                 if self.positions.get(position).collidepoint(event.pos):
                     return ["place_cards", position]
 
+    def update_pos(self):
+        #cards flying in land on their suit's place
+        if self.laid_out == self.version:
+            return
+        self.laid_out = self.version
+        for suit in self.cards:
+            for card in self.cards[suit]:
+                card.position.update(self.positions[suit])
+
+    def shown(self, suit):
+        """top card of a suit that isn't still flying in, or None"""
+        for card in reversed(self.cards[suit]):
+            if not card.flying:
+                return card
+        return None
+
+    def invalidated(self) -> list:
+        if self.drawn_version == self.version:
+            return []
+        self.drawn_version = self.version
+        #each suit is its own region, only redraw the ones that changed
+        state = {}
+        for suit in self.cards:
+            card = self.shown(suit)
+            state[suit] = None if card == None else card.name
+        changed = [self.positions[suit] for suit in state
+                   if self.drawn_state == None or self.drawn_state[suit] != state[suit]]
+        self.drawn_state = state
+        return changed
+
     def render(self, draw_surface):
         for suit in self.cards:
-            if len(self.cards.get(suit)) == 0:
-                asset = "assets\\foundation_" + suit + ".png"
-                draw_surface.blit(pygame.image.load(asset), self.positions[suit])
+            card = self.shown(suit)
+            if card == None:
+                asset = assets.get("foundation_" + suit)
+                draw_surface.blit(asset, self.positions[suit])
             else:
-                asset = self.cards[suit][-1].get_asset()
-                draw_surface.blit(pygame.image.load(asset), self.positions[suit])
+                asset = card.get_asset()
+                draw_surface.blit(asset, self.positions[suit])
 
 
 class card(game_object):
-    def __init__(self, name):
-        self.name = name
-        self.card_front = "assets\\" + name + ".png"
-        self.card_back = "assets\\card_back.png"
+    #set by animations, flying cards are drawn over every pile instead of
+    #by their own, and a card turning over shows its old side until it is
+    #drawn no width at all
+    flying = False
+    turning = False
+    width = 64
+
+    def __init__(self, code):
+        self.code = code
+        self.name = engine.card_name(code)
+        self.card_front = self.name
+        self.card_back = "card_back"
         self.visibility = False
-        self.position = None
-        self.set_properties(name)
-
-
-    def set_properties(self, name):
-        if "hearts" in name:
-            self.suit = "hearts"
-            self.colour = "red"
-        elif "diamonds" in name:
-            self.suit = "diamonds"
-            self.colour = "red"
-        elif "spades" in name:
-            self.suit = "spades"
-            self.colour = "black"
-        elif "clubs" in name:
-            self.suit = "clubs"
-            self.colour = "black"
-        self.value = name.split("_")[-1]
-        
+        #one rect for the life of the card, piles move it in place
+        self.position = pygame.Rect(0, 0, 64, 64)
+        self.suit = engine.SUITS[engine.suit(code)]
+        self.colour = "red" if engine.colour(code) == 0 else "black"
+        self.value = engine.VALUES[engine.rank(code)]
+
     def get_asset(self):
-        if self.visibility:
-            return self.card_front
+        if self.visibility != self.turning:
+            return assets.get(self.card_front)
         else:
-            return self.card_back
+            return assets.get(self.card_back)
+
+    def render(self, draw_surface):
+        if self.width == 64:
+            draw_surface.blit(self.get_asset(), self.position)
+            return
+        #turning over, the middle of the card narrowed to width
+        inset = (64 - self.width) // 2
+        draw_surface.blit(self.get_asset(), (self.position.x + inset, self.position.y),
+                          (inset, 0, self.width, 64))
 
 
 class moving_cards(game_object):
+    events = (pygame.MOUSEBUTTONUP, pygame.MOUSEMOTION)
+
     def __init__(self):
         self.cards = []
       
@@ -190,44 +322,142 @@ class moving_cards(game_object):
             if len(self.cards) != 0:
                 return ["return_cards"]
         elif event.type == pygame.MOUSEMOTION:
-            for card in self.cards:
-                card.position.move_ip(event.rel)
+            if len(self.cards) != 0:
+                #the cards are eased after the pointer as frames are drawn
+                return ["drag_cards", event.rel]
+
+    def invalidated(self) -> list:
+        return self.track_cards(self.cards)
 
     def render(self, draw_surface):
         for card in self.cards:
-            draw_surface.blit(pygame.image.load(card.get_asset()), card.position)
+            card.render(draw_surface)
+
+
+class hint_marker(game_object):
+    def __init__(self):
+        self.colour = (255, 215, 0)
+        self.cards = []
+        self.places = []
+
+    def show(self, cards, places):
+        self.cards = cards
+        self.places = places
+        self.changed()
+
+    def clear(self):
+        if len(self.cards) != 0 or len(self.places) != 0:
+            self.cards = []
+            self.places = []
+            self.changed()
+
+    def outlines(self) -> list:
+        rects = [card.position for card in self.cards]
+        if len(rects) != 0:
+            rects = [rects[0].unionall(rects[1:])]
+        return rects + self.places
+
+    def invalidated(self) -> list:
+        if self.version == self.drawn_state:
+            return []
+        return self.track(self.version, [rect.copy() for rect in self.outlines()])
+
+    def render(self, draw_surface):
+        #outlines are four filled edges so scaled windows can draw them too
+        for rect in self.outlines():
+            draw_surface.fill(self.colour, (rect.left, rect.top, rect.width, 2))
+            draw_surface.fill(self.colour, (rect.left, rect.bottom - 2, rect.width, 2))
+            draw_surface.fill(self.colour, (rect.left, rect.top, 2, rect.height))
+            draw_surface.fill(self.colour, (rect.right - 2, rect.top, 2, rect.height))
+
+
+class keyboard(game_object):
+    events = (pygame.KEYDOWN,)
+
+    def __init__(self):
+        self.actions = {pygame.K_h : "show_hint",
+                        pygame.K_z : "undo",
+                        pygame.K_u : "undo",
+                        pygame.K_y : "redo",
+                        pygame.K_r : "redo",
+                        pygame.K_s : "save",
+                        pygame.K_a : "auto_play",
+                        pygame.K_F3 : "profile",
+                        pygame.K_F4 : "export_profile"}
+
+    def event_listener(self, event):
+        if event.type == pygame.KEYDOWN and event.key in self.actions:
+            return [self.actions[event.key]]
 
 
 class new_game_button(game_object):
+    events = (pygame.MOUSEBUTTONDOWN,)
+
     def __init__(self):
-        self.asset = "assets\\new_game.png"
+        self.asset = assets.get("new_game")
         self.position = pygame.Rect(100, 20, 91, 30)
+        self.region = self.position
+        self.rects = [self.position]
 
     def event_listener(self, event):
         if event.type == pygame.MOUSEBUTTONDOWN:
             if self.position.collidepoint(event.pos):
                 return ["reset"]
 
+    def invalidated(self) -> list:
+        return self.track(self.asset, self.rects)
+
     def render(self, draw_surface):
-        draw_surface.blit(pygame.image.load(self.asset), self.position)
+        draw_surface.blit(self.asset, self.position)
+
+
+class text:
+    """
+    A line of text drawn once and kept, it is only rendered again when the
+    text itself changes.
+    """
+    def __init__(self, font, colour=(255, 255, 255)):
+        self.font = font
+        self.colour = colour
+        self.text = None
+        self.surface = None
+
+    def get(self, text) -> pygame.Surface:
+        if text != self.text:
+            self.text = text
+            self.surface = self.font.render(text, True, self.colour)
+        return self.surface
 
 
 class score(game_object):
     def __init__(self, font):
         self.value = 0
-        self.font = font
+        self.text = text(font)
+
+    def invalidated(self) -> list:
+        if self.value == self.drawn_state:
+            return []
+        surface = self.text.get(f"Score: {self.value}")
+        return self.track(self.value, [surface.get_rect(topleft=(200, 20))])
 
     def render(self, draw_surface):
-        draw_surface.blit(self.font.render(f"Score: {self.value}", True,
-                                           (255, 255, 255)), (200, 20))
+        draw_surface.blit(self.text.get(f"Score: {self.value}"), (200, 20))
 
 
 class game_win_message(game_object):
     def __init__(self, font):
         self.visibility = False
-        self.font = font
-        
+        self.text = text(font)
+        self.message = "You Win!"
+
+    def invalidated(self) -> list:
+        if not self.visibility:
+            return self.track(None, [])
+        if self.message == self.drawn_state:
+            return []
+        return self.track(self.message,
+                          [self.text.get(self.message).get_rect(topleft=(300, 20))])
+
     def render(self, draw_surface):
         if self.visibility:
-            draw_surface.blit(self.font.render(self.message, True,
-                                           (255, 255, 255)), (300, 20))
+            draw_surface.blit(self.text.get(self.message), (300, 20))
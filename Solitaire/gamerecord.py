@@ -0,0 +1,193 @@
+"""
+binary game records. a record is the deal number and the moves played,
+two bytes per move, and an archive is a file of records one after another.
+archives are read through a memory map so only the records being replayed
+are ever paged in. replays either fast forward through the engine or play
+the moves out in the game window
+"""
+import argparse
+import mmap
+import struct
+import sys
+import time
+from array import array
+import deals
+import engine
+
+MAGIC = b"SOL1"
+#deal number and number of moves, followed by the moves as uint16
+HEADER = struct.Struct("<QI")
+#deal numbers fit the header's uint64
+DEALS = 1 << 64
+
+
+def encode(deal_number, moves) -> bytes:
+    packed = array("H", moves)
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return HEADER.pack(deal_number, len(packed)) + packed.tobytes()
+
+def decode(data) -> tuple:
+    """the deal number and moves of a record made by encode"""
+    deal_number, count = HEADER.unpack_from(data)
+    moves = array("H")
+    moves.frombytes(bytes(data[HEADER.size:HEADER.size + count * 2]))
+    if sys.byteorder == "big":
+        moves.byteswap()
+    return deal_number, moves
+
+def save(path, deal_number, moves):
+    """adds a game to the end of an archive, starting it if needed"""
+    with open(path, "ab") as archive_file:
+        if archive_file.tell() == 0:
+            archive_file.write(MAGIC)
+        archive_file.write(encode(deal_number, moves))
+
+
+class archive:
+    """
+    Reads the records in an archive file. Use it in a with block, the move
+    views it gives out point into the memory map and are only valid inside.
+    """
+    def __init__(self, path):
+        self.path = path
+
+    def __enter__(self):
+        self.file = open(self.path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{self.path} is not a game archive")
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def __iter__(self):
+        """
+        Yields (deal number, moves) for each record in the archive. Raises
+        ValueError at a record cut short by the end of the file.
+        """
+        view = memoryview(self.map)
+        offset = len(MAGIC)
+        try:
+            while offset < len(self.map):
+                if offset + HEADER.size > len(self.map):
+                    raise ValueError(f"{self.path}: record at byte {offset} is cut short")
+                deal_number, count = HEADER.unpack_from(self.map, offset)
+                if offset + HEADER.size + count * 2 > len(self.map):
+                    raise ValueError(f"{self.path}: record at byte {offset} is cut short")
+                offset += HEADER.size
+                moves = view[offset:offset + count * 2].cast("H")
+                if sys.byteorder == "big":
+                    moves = array("H", moves)
+                    moves.byteswap()
+                yield deal_number, moves
+                offset += count * 2
+        finally:
+            view.release()
+
+
+def replay(deal_number, moves) -> engine.game:
+    """
+    Fast forwards through a game headlessly and returns the final state.
+    Raises ValueError if a move is not legal where it was played.
+    """
+    state = engine.game(deals.deal(deal_number), deal_number)
+    for index in range(len(moves)):
+        if not state.is_legal(moves[index]):
+            raise ValueError(f"deal {deal_number}: move {index} is not legal")
+        state.apply(moves[index])
+    return state
+
+def check(path) -> dict:
+    """replays every game in an archive, for regression checks"""
+    results = {"games" : 0, "moves" : 0, "wins" : 0, "failed" : []}
+    started = time.perf_counter()
+    with archive(path) as games:
+        try:
+            for deal_number, moves in games:
+                results["games"] += 1
+                results["moves"] += len(moves)
+                try:
+                    results["wins"] += replay(deal_number, moves).won()
+                except ValueError as error:
+                    results["failed"].append(str(error))
+                del moves
+        except ValueError as error:
+            results["failed"].append(str(error))
+    elapsed = time.perf_counter() - started
+    results["moves_per_second"] = results["moves"] / max(elapsed, 1e-9)
+    return results
+
+def play(deal_number, moves, speed=4):
+    """
+    Plays a game out in the window at speed moves per second. Raises
+    ValueError before the window opens if a move is not legal.
+    """
+    import pygame
+    import gamelogic
+
+    moves = list(moves)
+    #the window's play trusts its moves, so they are checked headlessly first
+    replay(deal_number, moves)
+    game = gamelogic.solitaire(deal_number)
+    clock = pygame.time.Clock()
+    for move in moves:
+        #frames keep coming between moves so the cards are seen flying
+        for frame in range(max(1, round(60 / speed))):
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    return
+            clock.tick(60)
+            game.update_pos()
+            game.render()
+        game.play(move, auto=False)
+    while game.animations.running():
+        clock.tick(60)
+        game.update_pos()
+        game.render()
+    game.update_pos()
+    game.render()
+    while pygame.event.wait().type != pygame.QUIT:
+        pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="check or watch recorded games")
+    parser.add_argument("mode", choices=["check", "play"])
+    parser.add_argument("archive")
+    parser.add_argument("--game", type=int, default=0,
+                        help="which game in the archive to play")
+    parser.add_argument("--speed", type=float, default=4,
+                        help="moves per second when playing")
+    arguments = parser.parse_args()
+
+    if arguments.mode == "check":
+        results = check(arguments.archive)
+        print(f"games: {results['games']}")
+        print(f"moves: {results['moves']}")
+        print(f"wins: {results['wins']}")
+        print(f"moves per second: {results['moves_per_second']:.0f}")
+        for failure in results["failed"]:
+            print(failure)
+        sys.exit(1 if len(results["failed"]) != 0 else 0)
+
+    selected = None
+    try:
+        with archive(arguments.archive) as games:
+            for index, (deal_number, moves) in enumerate(games):
+                if index == arguments.game:
+                    selected = (deal_number, list(moves))
+                del moves
+                if selected != None:
+                    break
+        if selected == None:
+            sys.exit(f"{arguments.archive} has no game {arguments.game}")
+        play(selected[0], selected[1], arguments.speed)
+    except ValueError as error:
+        sys.exit(str(error))
@@ -0,0 +1,46 @@
+"""
+move journal for undo and redo. every move is kept as the engine's fixed
+size undo record in an array of 32 bit ints, so a game of thousands of
+moves stays a few kilobytes and nothing is ever copied
+"""
+from array import array
+
+MOVE_BITS = (1 << 13) - 1
+
+
+class journal:
+    def __init__(self):
+        self.records = array("I")
+        self.cursor = 0
+
+    def __len__(self):
+        return self.cursor
+
+    def record(self, record):
+        """adds a move that was just applied, dropping anything to redo"""
+        if self.cursor != len(self.records):
+            del self.records[self.cursor:]
+        self.records.append(record)
+        self.cursor += 1
+
+    def undo(self, state) -> int:
+        """reverses the last move on state, returns its record or None"""
+        if self.cursor == 0:
+            return None
+        self.cursor -= 1
+        record = self.records[self.cursor]
+        state.undo(record)
+        return record
+
+    def redo(self, state) -> int:
+        """applies the last undone move again, returns its record or None"""
+        if self.cursor == len(self.records):
+            return None
+        record = state.apply(self.records[self.cursor] & MOVE_BITS)
+        self.records[self.cursor] = record
+        self.cursor += 1
+        return record
+
+    def moves(self) -> list:
+        """the moves played so far, without their undo flags"""
+        return [record & MOVE_BITS for record in self.records[:self.cursor]]
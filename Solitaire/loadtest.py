@@ -0,0 +1,142 @@
+"""
+load test for server.py. stand in clients each keep a copy of their game,
+pick a random legal move, send it and time the reply, with more and more
+sessions open at once. the server is started in its own process unless
+one is given
+
+    python loadtest.py --sessions 10 100 1000 5000
+    python loadtest.py --port 8765 --no-spawn
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import deals
+import engine
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+async def request(reader, writer, message) -> dict:
+    writer.write(json.dumps(message, separators=(",", ":")).encode() + b"\n")
+    await writer.drain()
+    return json.loads(await reader.readline())
+
+async def client(host, port, sessions, moves, latencies, generator, verify):
+    """
+    One connection playing several sessions in turn, one move in flight at
+    a time, the way a front end proxy would pass moves on.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    games = {}
+    for x in range(sessions):
+        deal_number = generator.getrandbits(32)
+        reply = await request(reader, writer, {"op" : "new", "deal" : deal_number})
+        games[reply["session"]] = engine.game(deals.deal(deal_number), deal_number)
+    for x in range(moves):
+        for number, state in games.items():
+            move = generator.choice(state.legal_moves() or [engine.DRAW])
+            started = time.perf_counter()
+            reply = await request(reader, writer, {"op" : "move", "session" : number,
+                                                   "move" : move})
+            latencies.append(time.perf_counter() - started)
+            if "error" in reply:
+                raise RuntimeError(f"session {number}: {reply['error']}")
+            state.apply(move)
+            if verify and reply["score"] != state.score:
+                raise RuntimeError(f"session {number}: score differs")
+            if state.won():
+                #start again on the same session number's connection
+                deal_number = generator.getrandbits(32)
+                await request(reader, writer, {"op" : "close", "session" : number})
+                reply = await request(reader, writer, {"op" : "new", "deal" : deal_number})
+                games[reply["session"]] = engine.game(deals.deal(deal_number), deal_number)
+                del games[number]
+                break
+    #closed so the next level starts from no sessions
+    for number in games:
+        await request(reader, writer, {"op" : "close", "session" : number})
+    writer.close()
+
+def percentile(ordered, fraction) -> float:
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+async def level(host, port, sessions, connections, moves, verify) -> dict:
+    """plays moves rounds of one move per session across the connections"""
+    connections = min(connections, sessions)
+    latencies = []
+    generator = random.Random(sessions)
+    shares = [sessions // connections + (index < sessions % connections)
+              for index in range(connections)]
+    started = time.perf_counter()
+    await asyncio.gather(*(client(host, port, share, moves, latencies,
+                                  random.Random(generator.getrandbits(32)), verify)
+                           for share in shares))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {"sessions" : sessions,
+            "moves" : len(latencies),
+            "moves_per_second" : len(latencies) / elapsed,
+            "p50_ms" : 1000 * percentile(latencies, 0.5),
+            "p99_ms" : 1000 * percentile(latencies, 0.99)}
+
+async def stats(host, port) -> dict:
+    reader, writer = await asyncio.open_connection(host, port)
+    reply = await request(reader, writer, {"op" : "stats"})
+    writer.close()
+    return reply
+
+async def wait_for_server(host, port, timeout=10):
+    give_up = time.monotonic() + timeout
+    while True:
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+            writer.close()
+            return
+        except OSError:
+            if time.monotonic() > give_up:
+                raise
+            await asyncio.sleep(0.1)
+
+async def main(arguments):
+    server = None
+    if not arguments.no_spawn:
+        server = subprocess.Popen([sys.executable, os.path.join(HERE, "server.py"),
+                                   "--host", arguments.host,
+                                   "--port", str(arguments.port)], cwd=HERE)
+    try:
+        await wait_for_server(arguments.host, arguments.port)
+        print(f"{'sessions':>9} {'moves':>8} {'moves/s':>9} {'p50 ms':>8} {'p99 ms':>8}")
+        for sessions in arguments.sessions:
+            result = await level(arguments.host, arguments.port, sessions,
+                                 arguments.connections, arguments.moves, arguments.verify)
+            print(f"{result['sessions']:>9} {result['moves']:>8} "
+                  f"{result['moves_per_second']:>9.0f} {result['p50_ms']:>8.2f} "
+                  f"{result['p99_ms']:>8.2f}")
+        print(await stats(arguments.host, arguments.port))
+    finally:
+        if server != None:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="load test the game server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--no-spawn", action="store_true",
+                        help="use a server that is already running")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[10, 100, 1000],
+                        help="session counts to test, one after another")
+    parser.add_argument("--connections", type=int, default=50,
+                        help="client connections the sessions are spread over")
+    parser.add_argument("--moves", type=int, default=20,
+                        help="moves played in each session")
+    parser.add_argument("--verify", action="store_true",
+                        help="check every reply's score against the local copy")
+    arguments = parser.parse_args()
+    asyncio.run(main(arguments))
@@ -0,0 +1,158 @@
+"""
+keeps the legal moves of a game indexed by source and destination pile.
+after a move only the rows and columns of the piles it touched are worked
+out again, so asking for a hint or whether any moves are left is cheap
+"""
+import engine
+
+#the foundation is one destination here, the suit decides which pile
+SOURCES = list(range(engine.COLUMNS)) + [engine.EXTRA]
+DESTINATIONS = list(range(engine.COLUMNS)) + [engine.FOUNDATION]
+
+
+def reveals(state, move) -> bool:
+    """
+    A move between columns that takes every face up card off its column,
+    turning a hidden card over or emptying the column for something else.
+    """
+    origin = engine.source(move)
+    return engine.count(move) == len(state.columns[origin]) - state.hidden[origin] and \
+           (state.hidden[origin] != 0 or len(state.columns[engine.destination(move)]) != 0)
+
+def rank(state, move) -> int:
+    """
+    How useful a legal move looks, higher is better. A safe card to the
+    foundation, then a move that reveals, any other card to the
+    foundation, a card off the extra pile and a draw. Other moves between
+    columns rank 0, they change nothing that opens the game up.
+    """
+    origin = engine.source(move)
+    target = engine.destination(move)
+    if origin == engine.STOCK:
+        return 1
+    if target >= engine.FOUNDATION:
+        card = state.extra[-1] if origin == engine.EXTRA else state.columns[origin][-1]
+        return 5 if engine.safe(card, state.foundation) else 3
+    if origin == engine.EXTRA:
+        return 2
+    return 4 if reveals(state, move) else 0
+
+
+class move_index:
+    def __init__(self, state):
+        self.state = state
+        self.table = {source : {destination : [] for destination in DESTINATIONS}
+                      for source in SOURCES}
+        self.total = 0
+        #cards still in the stock, waste or extra cards as a bitmask
+        self.stock_side = 0
+        for card in bytes(state.stock) + bytes(state.waste) + bytes(state.extra):
+            self.stock_side |= 1 << card
+        for source in SOURCES:
+            for destination in DESTINATIONS:
+                self.update(source, destination)
+
+    def update(self, source, destination):
+        state = self.state
+        moves = []
+        if source == engine.EXTRA:
+            if len(state.extra) != 0:
+                candidates = [(state.extra[-1], 1)]
+            else:
+                candidates = []
+        else:
+            cards = state.columns[source]
+            candidates = [(cards[index], len(cards) - index)
+                          for index in range(state.hidden[source], len(cards))]
+
+        if destination == engine.FOUNDATION:
+            if len(candidates) != 0 and engine.can_found(candidates[-1][0], state.foundation):
+                card = candidates[-1][0]
+                moves.append(engine.move(source, engine.FOUNDATION + (card & 3)))
+        elif destination != source:
+            cards = state.columns[destination]
+            for card, count in candidates:
+                if len(cards) == 0:
+                    #moving a column with nothing under it to another empty
+                    #column changes nothing
+                    if source != engine.EXTRA and state.hidden[source] == 0 and \
+                       count == len(state.columns[source]):
+                        continue
+                    moves.append(engine.move(source, destination, count))
+                elif engine.can_stack(card, cards[-1]):
+                    moves.append(engine.move(source, destination, count))
+
+        self.total += len(moves) - len(self.table[source][destination])
+        self.table[source][destination] = moves
+
+    def refresh(self, pile):
+        """works out the moves from and onto pile again"""
+        if pile in self.table:
+            for destination in DESTINATIONS:
+                self.update(pile, destination)
+        if pile in DESTINATIONS:
+            for source in SOURCES:
+                self.update(source, pile)
+
+    def moved(self, record):
+        """
+        Updates the index after the move in an undo record was applied or
+        undone, only the piles it touched can have changed.
+        """
+        origin, target = engine.touched(record)
+        if origin == engine.STOCK:
+            self.refresh(engine.EXTRA)
+            return
+        self.refresh(origin)
+        self.refresh(target)
+        if origin == engine.EXTRA:
+            #a card off the extra pile leaves the stock side, or comes back
+            self.stock_side = 0
+            for card in bytes(self.state.stock) + bytes(self.state.waste) + \
+                        bytes(self.state.extra):
+                self.stock_side |= 1 << card
+
+    def any_moves(self) -> bool:
+        return self.total != 0
+
+    def hint(self) -> int:
+        """
+        The most useful move available, see rank. Draws come before moves
+        between columns that reveal nothing, and returns None when the game
+        is stuck.
+        """
+        state = self.state
+        best = None
+        best_rank = -1
+        for source in SOURCES:
+            for destination in DESTINATIONS:
+                for move in self.table[source][destination]:
+                    value = rank(state, move)
+                    if value > best_rank:
+                        best = move
+                        best_rank = value
+        if best_rank < 1 and self.stock_side != 0 and not self.dead_end():
+            return engine.DRAW
+        return best
+
+    def dead_end(self) -> bool:
+        """
+        No move is left and no card in the stock, waste or extra cards could
+        be placed anywhere, however many times the stock is drawn through.
+        """
+        if self.total != 0 or self.stock_side == 0:
+            return False
+        state = self.state
+        wanted = 0
+        for suit in range(4):
+            if state.foundation[suit] < 13:
+                wanted |= 1 << (state.foundation[suit] << 2 | suit)
+        for cards in state.columns:
+            if len(cards) == 0:
+                return False
+            below = (cards[-1] >> 2) - 1
+            if below >= 0:
+                #the two cards of the other colour one rank lower
+                other = 2 - (cards[-1] & 2)
+                wanted |= 1 << (below << 2 | other) | 1 << (below << 2 | other + 1)
+        return self.stock_side & wanted == 0
@@ -0,0 +1,213 @@
+"""
+optional instrumentation for a running game. while enabled every
+component's event_listener, update_pos and render and every handler in
+solitaire.events is swapped for a timed wrapper, and a hud shows the frame
+rate and the slowest parts. disabled, the wrappers are removed again so
+nothing in the game pays for the profiler being there
+"""
+import json
+import time
+from collections import deque
+import pygame
+import assets
+import gameobject
+
+METHODS = ["event_listener", "update_pos", "render"]
+#histogram buckets by powers of two microseconds, the last takes the rest
+BUCKETS = 20
+
+
+class counting_surface:
+    """stands in for the window while rendering and counts the blits"""
+    def __init__(self):
+        self.target = None
+        self.blits = 0
+
+    def blit(self, source, dest, area=None, special_flags=0):
+        self.blits += 1
+        return self.target.blit(source, dest, area, special_flags)
+
+    def __getattr__(self, name):
+        return getattr(self.target, name)
+
+
+class profiler:
+    def __init__(self, game, max_trace_events=100000):
+        self.game = game
+        self.enabled = False
+        self.surface = counting_surface()
+        self.hud = hud()
+        self.histograms = {}
+        self.calls = {}
+        self.totals = {}
+        #time spent since the hud was last refreshed, for the top offenders
+        self.recent = {}
+        self.trace = deque(maxlen=max_trace_events)
+        self.frame_times = deque(maxlen=120)
+        self.frames = deque(maxlen=max_trace_events)
+        self.started = time.perf_counter()
+
+    def timed(self, name, function):
+        histogram = self.histograms.setdefault(name, [0] * BUCKETS)
+        clock = time.perf_counter
+
+        def wrapper(*arguments):
+            started = clock()
+            try:
+                return function(*arguments)
+            finally:
+                spent = clock() - started
+                histogram[min(int(spent * 1e6).bit_length(), BUCKETS - 1)] += 1
+                self.calls[name] = self.calls.get(name, 0) + 1
+                self.totals[name] = self.totals.get(name, 0) + spent
+                self.recent[name] = self.recent.get(name, 0) + spent
+                self.trace.append((name, started, spent))
+        return wrapper
+
+    def enable(self):
+        if self.enabled:
+            return
+        self.enabled = True
+        game = self.game
+        for name, component in game.components.items():
+            for method in METHODS:
+                function = getattr(component, method)
+                if method == "render":
+                    function = self.counted(function)
+                setattr(component, method, self.timed(name + "." + method, function))
+        self.handlers = dict(game.events)
+        for action, handler in self.handlers.items():
+            game.events[action] = self.timed("solitaire." + action, handler)
+        game.render = self.frame(game.render)
+        game.update_pos = self.timed("solitaire.update_pos", game.update_pos)
+        game.components["profiler"] = self.hud
+
+    def disable(self):
+        if not self.enabled:
+            return
+        self.enabled = False
+        game = self.game
+        del game.components["profiler"]
+        for component in game.components.values():
+            for method in METHODS:
+                del component.__dict__[method]
+        game.events.update(self.handlers)
+        del game.render
+        del game.update_pos
+        #the hud area goes back to showing the table underneath
+        game.components["board"].drawn_state = None
+
+    def toggle(self):
+        if self.enabled:
+            self.disable()
+        else:
+            self.enable()
+
+    def counted(self, render):
+        surface = self.surface
+
+        def wrapper(draw_surface):
+            surface.target = draw_surface
+            render(surface)
+        return wrapper
+
+    def frame(self, render):
+        """wraps solitaire.render so every frame's totals are kept"""
+        timed = self.timed("solitaire.render", render)
+
+        def wrapper():
+            blits = self.surface.blits
+            loads = assets.loads()
+            started = time.perf_counter()
+            timed()
+            self.frame_times.append(started)
+            self.frames.append((started, time.perf_counter() - started,
+                                self.surface.blits - blits, assets.loads() - loads))
+            if started - self.hud.refreshed >= self.hud.interval:
+                self.hud.show(self.summary_lines(), started)
+                self.recent.clear()
+        return wrapper
+
+    def fps(self) -> float:
+        if len(self.frame_times) < 2:
+            return 0
+        return (len(self.frame_times) - 1) / max(self.frame_times[-1] - self.frame_times[0], 1e-9)
+
+    def top(self, count=3) -> list:
+        """the calls that took the most time since the hud was refreshed"""
+        names = [name for name in self.recent if not name.startswith("solitaire.render")]
+        names.sort(key=lambda name: self.recent[name], reverse=True)
+        return [(name, self.recent[name]) for name in names[:count]]
+
+    def summary_lines(self) -> list:
+        last = self.frames[-1] if len(self.frames) != 0 else (0, 0, 0, 0)
+        lines = [f"{self.fps():.0f} fps  frame {1000 * last[1]:.2f} ms  "
+                 f"blits {last[2]}  loads {last[3]}"]
+        for name, spent in self.top():
+            lines.append(f"{name} {1000 * spent:.2f} ms")
+        return lines
+
+    def export(self, path="profile.json"):
+        """
+        Writes the timed calls kept so far as a chrome trace, it opens in
+        chrome://tracing or perfetto. Histograms and frame totals go in the
+        metadata.
+        """
+        events = [{"name" : name,
+                   "cat" : name.split(".")[0],
+                   "ph" : "X",
+                   "ts" : 1e6 * (started - self.started),
+                   "dur" : 1e6 * spent,
+                   "pid" : 0,
+                   "tid" : 0}
+                  for name, started, spent in self.trace]
+        for started, spent, blits, loads in self.frames:
+            events.append({"name" : "frame", "ph" : "C", "pid" : 0,
+                           "ts" : 1e6 * (started - self.started),
+                           "args" : {"blits" : blits, "loads" : loads}})
+        histograms = {name : {"calls" : self.calls.get(name, 0),
+                              "total_ms" : 1000 * self.totals.get(name, 0),
+                              "buckets_us" : histogram}
+                      for name, histogram in self.histograms.items()}
+        with open(path, "w") as trace_file:
+            json.dump({"traceEvents" : events,
+                       "displayTimeUnit" : "ms",
+                       "otherData" : {"histograms" : histograms}}, trace_file)
+
+
+class hud(gameobject.game_object):
+    def __init__(self):
+        self.font = None
+        self.lines = []
+        self.surfaces = []
+        self.refreshed = 0
+        #seconds between refreshes, so the hud itself costs little
+        self.interval = 0.5
+        self.position = pygame.Rect(0, 330, 0, 0)
+
+    def show(self, lines, now):
+        self.refreshed = now
+        if lines == self.lines:
+            return
+        if self.font == None:
+            self.font = pygame.font.Font(None, 16)
+        self.lines = lines
+        self.surfaces = [self.font.render(line, True, (255, 255, 255)) for line in lines]
+        width = max(surface.get_width() for surface in self.surfaces) + 8
+        height = sum(surface.get_height() for surface in self.surfaces) + 8
+        self.position = pygame.Rect(0, 400 - height, width, height)
+        self.changed()
+
+    def invalidated(self) -> list:
+        if self.version == self.drawn_state:
+            return []
+        return self.track(self.version, [self.position.copy()])
+
+    def render(self, draw_surface):
+        if len(self.surfaces) == 0:
+            return
+        draw_surface.fill((0, 0, 0), self.position)
+        y = self.position.top + 4
+        for surface in self.surfaces:
+            draw_surface.blit(surface, (4, y))
+            y += surface.get_height()
@@ -0,0 +1,122 @@
+"""
+lets the game draw in its own 576x400 layout on a window of any size. the
+components keep drawing as before onto a scaled_window, which moves every
+draw to window coordinates and swaps each surface for a copy made once per
+scale, so nothing is smooth scaled while frames are drawn
+"""
+import math
+from collections import OrderedDict
+import pygame
+import assets
+
+LAYOUT = (576, 400)
+#scales are rounded down to steps of this so small resizes reuse a scale
+STEP = 1 / 16
+#scaled copies of surfaces that aren't assets, like text
+SCALED_SURFACES = 64
+
+
+class scaled_window:
+    def __init__(self, window):
+        self.window = window
+        self.clip = None
+        self.surfaces = OrderedDict()
+        self.mouse = (0, 0)
+        self.resize(window)
+
+    def resize(self, window):
+        """fits the layout in the window as large as it goes, centred"""
+        self.window = window
+        width, height = window.get_size()
+        fit = min(width / LAYOUT[0], height / LAYOUT[1])
+        self.scale = max(STEP, math.floor(fit / STEP) * STEP)
+        self.offset = ((width - round(LAYOUT[0] * self.scale)) // 2,
+                       (height - round(LAYOUT[1] * self.scale)) // 2)
+        self.surfaces.clear()
+        #the bars around the layout are pushed with the next frame
+        self.window.fill((0, 0, 0))
+        self.resized = True
+
+    def get_size(self) -> tuple:
+        return LAYOUT
+
+    def to_window(self, rect) -> pygame.Rect:
+        """the window area covering a layout rect, rounded outwards"""
+        rect = pygame.Rect(rect)
+        left = math.floor(rect.left * self.scale) + self.offset[0]
+        top = math.floor(rect.top * self.scale) + self.offset[1]
+        right = math.ceil(rect.right * self.scale) + self.offset[0]
+        bottom = math.ceil(rect.bottom * self.scale) + self.offset[1]
+        return pygame.Rect(left, top, right - left, bottom - top)
+
+    def to_layout(self, pos) -> tuple:
+        return (int((pos[0] - self.offset[0]) // self.scale),
+                int((pos[1] - self.offset[1]) // self.scale))
+
+    def event(self, event) -> pygame.event.Event:
+        """a mouse event with its position and movement in the layout"""
+        if not hasattr(event, "pos"):
+            return event
+        pos = self.to_layout(event.pos)
+        attributes = dict(event.__dict__)
+        attributes["pos"] = pos
+        if event.type == pygame.MOUSEMOTION:
+            #movement from the rounded positions so dragged cards don't drift
+            attributes["rel"] = (pos[0] - self.mouse[0], pos[1] - self.mouse[1])
+        self.mouse = pos
+        return pygame.event.Event(event.type, attributes)
+
+    def scaled(self, surface) -> pygame.Surface:
+        scaled = assets.scaled(surface, self.scale)
+        if scaled != None:
+            return scaled
+        if surface in self.surfaces:
+            self.surfaces.move_to_end(surface)
+            return self.surfaces[surface]
+        width, height = surface.get_size()
+        scaled = pygame.transform.smoothscale(
+            surface, (int(width * self.scale), int(height * self.scale)))
+        self.surfaces[surface] = scaled
+        if len(self.surfaces) > SCALED_SURFACES:
+            self.surfaces.popitem(last=False)
+        return scaled
+
+    #the parts of the surface interface components draw with
+    def blit(self, source, dest, area=None, special_flags=0):
+        #sizes are rounded down so a surface never reaches past the window
+        #area its layout rect covers, dirty rects stay exact at any scale
+        dest = pygame.Rect(dest[0], dest[1], 0, 0)
+        if area != None:
+            area = pygame.Rect(area)
+            covered = self.to_window((dest.topleft, area.size))
+            area = pygame.Rect(math.floor(area.left * self.scale),
+                               math.floor(area.top * self.scale),
+                               covered.width, covered.height)
+        return self.window.blit(self.scaled(source), self.to_window(dest).topleft,
+                                area, special_flags)
+
+    def fill(self, colour, rect=None, special_flags=0):
+        if rect == None:
+            rect = pygame.Rect((0, 0), LAYOUT)
+        return self.window.fill(colour, self.to_window(rect), special_flags)
+
+    def set_clip(self, rect):
+        self.clip = rect
+        #never into the bars, nothing draws over them again
+        layout = self.to_window(pygame.Rect((0, 0), LAYOUT))
+        self.window.set_clip(layout if rect == None else self.to_window(rect).clip(layout))
+
+    def get_clip(self) -> pygame.Rect:
+        if self.clip == None:
+            return pygame.Rect((0, 0), LAYOUT)
+        #the window clip was rounded outwards, so a layout rect only clear
+        #of it by less than a window pixel may still reach into it
+        pad = math.ceil(1 / self.scale)
+        return pygame.Rect(self.clip).inflate(2 * pad, 2 * pad)
+
+    def update(self, rects):
+        if self.resized:
+            self.resized = False
+            pygame.display.update()
+            return
+        pygame.display.update([self.to_window(rect) for rect in rects])
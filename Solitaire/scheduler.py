@@ -0,0 +1,40 @@
+"""
+decides when the main loop wakes up. while cards are being dragged or
+animated frames come at a capped rate, otherwise the loop sleeps in
+pygame.event.wait until there is input, so an idle game uses no cpu
+"""
+import pygame
+
+#fps cap while busy as a fraction of the chosen fps, and whether an idle
+#game sleeps until input or keeps polling at the full rate
+POLICIES = {"performance" : (1, False),
+            "balanced" : (1, True),
+            "saver" : (0.5, True)}
+
+
+class scheduler:
+    def __init__(self, fps=60, policy="balanced", idle_timeout=1000):
+        scale, self.sleeps = POLICIES[policy]
+        self.fps = max(1, int(fps * scale))
+        self.policy = policy
+        #longest time in milliseconds an idle loop sleeps before waking anyway
+        self.idle_timeout = idle_timeout
+        self.clock = pygame.time.Clock()
+        self.frames = 0
+
+    def events(self, busy) -> list:
+        """
+        Waits for the next frame and returns the events that arrived. A busy
+        game gets a frame every 1 / fps seconds, an idle one blocks until
+        the first event or the idle timeout.
+        """
+        self.frames += 1
+        if busy or not self.sleeps:
+            self.clock.tick(self.fps)
+            return pygame.event.get()
+        first = pygame.event.wait(self.idle_timeout)
+        #restart the frame timer so the first busy frame is not cut short
+        self.clock.tick()
+        if first.type == pygame.NOEVENT:
+            return []
+        return [first] + pygame.event.get()
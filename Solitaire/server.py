@@ -0,0 +1,257 @@
+"""
+hosts many games from one process for a web front end. clients send json
+lines over a local socket. each game is a session holding only the engine
+state and its move journal, replies carry just the piles a move changed,
+and sessions left idle are packed down to their game record until they
+are used again. only so many packed sessions are kept, the longest unused
+are dropped first
+
+    {"op": "new", "deal": 7}                 -> session and every pile
+    {"op": "move", "session": 1, "move": 380} -> the piles that changed
+    {"op": "move", "session": 1, "move": [12, 7, 1]}
+    {"op": "undo" / "redo" / "hint" / "state" / "close", "session": 1}
+    {"op": "stats"}
+
+a request may carry an "id", which comes back in its reply
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import deals
+import engine
+import gamerecord
+import journal
+import moveindex
+
+#names of the piles in replies, the same as the window's components
+PILE_NAMES = ["column_" + str(number + 1) for number in range(engine.COLUMNS)] + \
+             ["extra_cards", "foundation", None, None, None, "stock"]
+
+
+class session:
+    #thousands of these are kept, so no per instance dict
+    __slots__ = ("deal_number", "state", "journal", "used")
+
+    def __init__(self, deal_number, moves=()):
+        self.deal_number = deal_number
+        self.state = engine.game(deals.deal(deal_number), deal_number)
+        self.journal = journal.journal()
+        for move in moves:
+            self.journal.record(self.state.apply(move))
+        self.used = time.monotonic()
+
+    def pack(self) -> bytes:
+        """the game as a game record, moves that were undone are dropped"""
+        return gamerecord.encode(self.deal_number, self.journal.moves())
+
+    def pile(self, pile):
+        """what a client is shown of a pile, face down cards only as a count"""
+        state = self.state
+        if pile == engine.STOCK:
+            return {"stock" : len(state.stock), "waste" : len(state.waste)}
+        if pile == engine.EXTRA:
+            return list(state.extra)
+        if pile == engine.FOUNDATION:
+            return list(state.foundation)
+        cards = state.columns[pile]
+        return {"hidden" : state.hidden[pile], "cards" : list(cards[state.hidden[pile]:])}
+
+    def piles(self, piles) -> dict:
+        return {PILE_NAMES[pile] : self.pile(pile) for pile in piles}
+
+
+class server:
+    def __init__(self, idle=300, sweep=10, max_packed=100000):
+        self.sessions = {}
+        #session number -> packed game record of sessions evicted while idle,
+        #oldest first
+        self.packed = {}
+        self.max_packed = max_packed
+        self.next_session = 1
+        self.idle = idle
+        self.sweep = sweep
+        self.requests = 0
+        self.operations = {"new" : self.new,
+                           "move" : self.move,
+                           "undo" : self.undo,
+                           "redo" : self.redo,
+                           "hint" : self.hint,
+                           "state" : self.state,
+                           "close" : self.close,
+                           "stats" : self.stats}
+
+    def handle(self, request) -> dict:
+        """answers one request, errors are replies rather than exceptions"""
+        self.requests += 1
+        try:
+            reply = self.dispatch(request)
+        except Exception as error:
+            reply = {"error" : f"failed: {type(error).__name__}"}
+        if "id" in request:
+            reply["id"] = request["id"]
+        return reply
+
+    def dispatch(self, request) -> dict:
+        operation = self.operations.get(request.get("op"))
+        if operation == None:
+            return {"error" : "unknown op"}
+        if operation in (self.new, self.stats):
+            return operation(request)
+        game = self.find(request.get("session"))
+        if game == None:
+            return {"error" : "no such session"}
+        game.used = time.monotonic()
+        return operation(game, request)
+
+    def find(self, number) -> session:
+        """a live session, unpacking it first if it was evicted"""
+        if type(number) != int:
+            return None
+        game = self.sessions.get(number)
+        if game == None and number in self.packed:
+            deal_number, moves = gamerecord.decode(self.packed.pop(number))
+            game = session(deal_number, moves)
+            self.sessions[number] = game
+        return game
+
+    def evict(self, now=None) -> int:
+        """
+        Packs sessions that have been idle too long and drops the oldest
+        packed ones past max_packed, returns how many were packed.
+        """
+        now = time.monotonic() if now == None else now
+        idle = [number for number, game in self.sessions.items()
+                if now - game.used >= self.idle]
+        for number in idle:
+            #packed first so a session that fails to pack is still there
+            self.packed[number] = self.sessions[number].pack()
+            del self.sessions[number]
+        while len(self.packed) > self.max_packed:
+            del self.packed[next(iter(self.packed))]
+        return len(idle)
+
+    def result(self, game, record) -> dict:
+        """the reply for a move, only the piles it touched are sent"""
+        return {"piles" : game.piles(engine.touched(record)),
+                "score" : game.state.score,
+                "won" : game.state.won()}
+
+    #operations
+    def new(self, request) -> dict:
+        deal_number = request.get("deal")
+        if deal_number == None:
+            deal_number = random.getrandbits(32)
+        elif type(deal_number) != int or not 0 <= deal_number < gamerecord.DEALS:
+            return {"error" : "bad deal"}
+        number = self.next_session
+        self.next_session += 1
+        game = session(deal_number)
+        self.sessions[number] = game
+        return {"session" : number, "deal" : deal_number,
+                "piles" : game.piles(moveindex.SOURCES + [engine.FOUNDATION, engine.STOCK]),
+                "score" : 0, "won" : False}
+
+    def move(self, game, request) -> dict:
+        move = request.get("move")
+        #a move is the engine's int or [source, destination, count]
+        if type(move) == list and len(move) in (2, 3) and \
+           all(type(part) == int for part in move):
+            move = engine.move(*move)
+        if type(move) != int or not 0 <= move <= journal.MOVE_BITS or \
+           not game.state.is_legal(move):
+            return {"error" : "illegal move"}
+        record = game.state.apply(move)
+        game.journal.record(record)
+        return self.result(game, record)
+
+    def undo(self, game, request) -> dict:
+        record = game.journal.undo(game.state)
+        if record == None:
+            return {"error" : "nothing to undo"}
+        return self.result(game, record)
+
+    def redo(self, game, request) -> dict:
+        record = game.journal.redo(game.state)
+        if record == None:
+            return {"error" : "nothing to redo"}
+        return self.result(game, record)
+
+    def hint(self, game, request) -> dict:
+        return {"move" : moveindex.move_index(game.state).hint()}
+
+    def state(self, game, request) -> dict:
+        return {"piles" : game.piles(moveindex.SOURCES + [engine.FOUNDATION, engine.STOCK]),
+                "score" : game.state.score,
+                "won" : game.state.won()}
+
+    def close(self, game, request) -> dict:
+        del self.sessions[request["session"]]
+        return {"closed" : True}
+
+    def stats(self, request) -> dict:
+        return {"sessions" : len(self.sessions),
+                "packed" : len(self.packed),
+                "packed_bytes" : sum(len(data) for data in self.packed.values()),
+                "requests" : self.requests}
+
+    #networking
+    async def connection(self, reader, writer):
+        """serves one client, a json request per line and a reply per line"""
+        try:
+            while True:
+                line = await reader.readline()
+                if len(line) == 0:
+                    break
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    request = None
+                if type(request) == dict:
+                    reply = self.handle(request)
+                else:
+                    reply = {"error" : "bad request"}
+                writer.write(json.dumps(reply, separators=(",", ":")).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def sweeper(self):
+        while True:
+            await asyncio.sleep(self.sweep)
+            self.evict()
+
+    async def serve(self, host="127.0.0.1", port=8765, path=None):
+        """serves on a tcp port, or a unix socket when path is given"""
+        if path != None:
+            listener = await asyncio.start_unix_server(self.connection, path)
+        else:
+            listener = await asyncio.start_server(self.connection, host, port)
+        sweeper = asyncio.create_task(self.sweeper())
+        try:
+            async with listener:
+                await listener.serve_forever()
+        finally:
+            sweeper.cancel()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="serve solitaire games over json lines")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="serve on this unix socket path instead")
+    parser.add_argument("--idle", type=float, default=300,
+                        help="seconds before an idle session is packed away")
+    parser.add_argument("--sweep", type=float, default=10,
+                        help="seconds between looks for idle sessions")
+    parser.add_argument("--max-packed", type=int, default=100000,
+                        help="packed sessions kept before the oldest are dropped")
+    arguments = parser.parse_args()
+    try:
+        asyncio.run(server(arguments.idle, arguments.sweep, arguments.max_packed).serve(
+            arguments.host, arguments.port, arguments.unix))
+    except KeyboardInterrupt:
+        pass
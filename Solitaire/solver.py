@@ -0,0 +1,372 @@
+"""
+finds a way to win a deal over the headless engine, then the shortest way
+using iterative deepening A* while the node budget lasts. positions are
+identified by zobrist hashes that are updated from each move's undo
+record. the first search follows the greedy player's line and only backs
+up where it got stuck, and a bounded transposition table remembers how far
+from a win each position was found to be for the second
+"""
+import argparse
+import random
+import time
+import tracemalloc
+from collections import OrderedDict
+import deals
+import engine
+import moveindex
+
+MASK = (1 << 64) - 1
+FOUND = -1
+
+
+class zobrist:
+    def __init__(self, seed=0x5017, stock_order=True):
+        """
+        Without stock_order the stock and waste hash as the set of cards in
+        them, positions that only differ in their order or in how many
+        passes were made hash the same.
+        """
+        generator = random.Random(seed)
+        def keys(count):
+            return [generator.getrandbits(64) for x in range(count)]
+        #one key per card per position in each pile
+        self.columns = [[keys(52) for position in range(20)]
+                        for column in range(engine.COLUMNS)]
+        self.hidden = [keys(engine.COLUMNS) for column in range(engine.COLUMNS)]
+        self.foundation = [keys(14) for suit in range(4)]
+        self.stock = [keys(52) for position in range(52)]
+        self.waste = [keys(52) for position in range(52)]
+        self.extra = [keys(52) for position in range(4)]
+        self.passes = generator.getrandbits(64) | 1
+        if not stock_order:
+            self.stock = self.waste = [self.stock[0]] * 52
+            self.passes = 0
+
+    def pile(self, keys, cards, start=0) -> int:
+        value = 0
+        for position in range(start, len(cards)):
+            value ^= keys[position][cards[position]]
+        return value
+
+    def stock_hash(self, state) -> int:
+        return self.pile(self.stock, state.stock) ^ \
+               self.pile(self.waste, state.waste) ^ \
+               self.pile(self.extra, state.extra) ^ \
+               (state.passes * self.passes & MASK)
+
+    def full_hash(self, state) -> int:
+        value = self.stock_hash(state)
+        for column in range(engine.COLUMNS):
+            value ^= self.pile(self.columns[column], state.columns[column])
+            value ^= self.hidden[column][state.hidden[column]]
+        for suit in range(4):
+            value ^= self.foundation[suit][state.foundation[suit]]
+        return value
+
+    def moved(self, value, state, record) -> int:
+        """
+        Updates value for a move that was just applied to state, only the
+        cards that changed position are hashed. Draws that move the extra
+        cards to the waste or turn the stock over need stock_hash instead.
+        """
+        origin = record & 15
+        target = record >> 4 & 15
+        moved = record >> 8 & 31
+        if origin == engine.STOCK:
+            top = len(state.extra) - 1
+            return value ^ self.stock[len(state.stock)][state.extra[top]] ^ \
+                   self.extra[top][state.extra[top]]
+
+        if target >= engine.FOUNDATION:
+            suit = target - engine.FOUNDATION
+            count = state.foundation[suit]
+            value ^= self.foundation[suit][count - 1] ^ self.foundation[suit][count]
+            cards = bytes([count - 1 << 2 | suit])
+        else:
+            cards = state.columns[target]
+            start = len(cards) - moved
+            value ^= self.pile(self.columns[target], cards, start)
+            cards = cards[start:]
+
+        if origin == engine.EXTRA:
+            value ^= self.extra[len(state.extra)][cards[0]]
+        else:
+            keys = self.columns[origin]
+            start = len(state.columns[origin])
+            for index in range(len(cards)):
+                value ^= keys[start + index][cards[index]]
+            if record & engine.FLIPPED:
+                hidden = self.hidden[origin]
+                value ^= hidden[state.hidden[origin]] ^ hidden[state.hidden[origin] + 1]
+        return value
+
+
+def estimate(state) -> int:
+    """
+    Lower bound on the moves left. Every card still to be drawn needs a
+    draw and a move off the extra cards, the extra cards just the move.
+    """
+    return 2 * (len(state.stock) + len(state.waste)) + len(state.extra)
+
+class solver:
+    def __init__(self, table_size=1 << 20, max_nodes=5000000, trace_memory=False,
+                 shortest=True):
+        self.keys = zobrist()
+        self.loose_keys = zobrist(stock_order=False)
+        self.table_size = table_size
+        self.max_nodes = max_nodes
+        #off, the first win found is returned without looking for a shorter one
+        self.shortest = shortest
+        self.trace_memory = trace_memory
+        self.table = OrderedDict()
+
+    def solve(self, state) -> list:
+        """
+        Searches for a list of moves that wins from state, then for the
+        shortest one with what is left of the node budget. Returns None when
+        no win was found, stats()["complete"] says whether every layout was
+        searched or the budget ran out first, and stats()["shortest"] whether
+        the moves are known to be the fewest. state is restored before
+        returning.
+        """
+        self.nodes = 0
+        self.probes = 0
+        self.hits = 0
+        self.table_peak = 0
+        self.complete = True
+        self.is_shortest = False
+        self.table.clear()
+        self.path = []
+        if self.trace_memory:
+            tracemalloc.start()
+        self.started = time.perf_counter()
+
+        value = self.keys.full_hash(state)
+        solution = self.find(state)
+        if solution != None and self.shortest:
+            #only bounds below the win already found are worth searching
+            bound = estimate(state)
+            self.is_shortest = True
+            while bound < len(solution):
+                self.cutoffs = 0
+                result = self.search(state, value, 0, bound)
+                if result == FOUND:
+                    solution = list(self.path)
+                    break
+                if result == None:
+                    self.is_shortest = False
+                    break
+                bound = result
+
+        self.elapsed = time.perf_counter() - self.started
+        self.peak_memory = None
+        if self.trace_memory:
+            self.peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        return solution
+
+    def find(self, state) -> list:
+        """
+        Depth first search for any win, trying moves best first by
+        moveindex.rank. Drawing stops after a whole pass through the stock
+        without another move, as that pass showed every card and none could
+        be played. Positions are told apart ignoring the order of the stock
+        and waste, which are shuffled again every pass anyway, so each
+        layout is searched once rather than once per stock order. That can
+        pass over a win that needs one particular order, so running out of
+        positions makes a win very unlikely rather than impossible. Returns
+        the moves, or None with complete cleared if the budget ran out.
+        """
+        if state.won():
+            return []
+        value = self.loose_keys.full_hash(state)
+        seen = {value}
+        moves = []
+        records = []
+        values = [value]
+        #moves left to try at each depth, best last, and the draws in a row
+        #that led to it
+        levels = [self.ranked(state, 0)]
+        draws = [0]
+        solution = None
+        while len(levels) != 0:
+            if len(levels[-1]) == 0:
+                levels.pop()
+                draws.pop()
+                if len(records) != 0:
+                    state.undo(records.pop())
+                    moves.pop()
+                    values.pop()
+                continue
+            move = levels[-1].pop()
+            record, child = self.step(state, self.loose_keys, values[-1], move)
+            if child in seen:
+                state.undo(record)
+                continue
+            seen.add(child)
+            self.nodes += 1
+            moves.append(move)
+            records.append(record)
+            values.append(child)
+            if state.won():
+                solution = list(moves)
+                break
+            if self.nodes > self.max_nodes:
+                self.complete = False
+                break
+            run = draws[-1] + 1 if move == engine.DRAW else 0
+            levels.append(self.ranked(state, run))
+            draws.append(run)
+        while len(records) != 0:
+            state.undo(records.pop())
+        return solution
+
+    def ranked(self, state, draws) -> list:
+        """children in the order find pops them, best last"""
+        moves = self.children(state)
+        if draws > len(state.stock) + len(state.waste) + len(state.extra) and \
+           engine.DRAW in moves:
+            moves.remove(engine.DRAW)
+        #a stable sort keeps children's order between moves of one rank
+        moves.sort(key=lambda move: moveindex.rank(state, move), reverse=True)
+        moves.reverse()
+        return moves
+
+    def step(self, state, keys, value, move) -> tuple:
+        """applies move, returns its undo record and the new position's hash"""
+        turnover = move == engine.DRAW and \
+                   (len(state.stock) == 0 or len(state.extra) >= 3)
+        if turnover:
+            child = value ^ keys.stock_hash(state)
+        record = state.apply(move)
+        if turnover:
+            child ^= keys.stock_hash(state)
+        else:
+            child = keys.moved(value, state, record)
+        return record, child
+
+    def search(self, state, value, depth, bound):
+        """
+        Depth first search cut off where depth plus the estimate passes
+        bound. Returns FOUND, the smallest bound that went over for the next
+        iteration or None once out of nodes.
+        """
+        self.nodes += 1
+        if state.won():
+            return FOUND
+        if self.nodes > self.max_nodes:
+            return None
+
+        remaining = estimate(state)
+        self.probes += 1
+        entry = self.table.get(value)
+        if entry != None:
+            self.hits += 1
+            remaining = max(remaining, entry[0])
+            #already reached this iteration from no deeper, nothing new below
+            if entry[1] == bound and entry[2] <= depth:
+                return bound + 1
+        if depth + remaining > bound:
+            self.cutoffs += 1
+            return depth + remaining
+        self.store(value, remaining, bound, depth)
+
+        lowest = float("inf")
+        for move in self.children(state):
+            record, child = self.step(state, self.keys, value, move)
+            self.path.append(move)
+            result = self.search(state, child, depth + 1, bound)
+            if result == FOUND:
+                state.undo(record)
+                return FOUND
+            self.path.pop()
+            state.undo(record)
+            if result == None:
+                return None
+            lowest = min(lowest, result)
+
+        #what was learned about this position is kept for later iterations
+        self.store(value, max(remaining, lowest - depth), bound, depth)
+        return lowest
+
+    def children(self, state) -> list:
+        """
+        Legal moves in the order they are tried with dominated moves left
+        out. A safe card on the extra pile always goes to the foundation, a
+        column with nothing hidden is never moved whole to an empty column
+        and a lone extra card is never turned over onto itself.
+        """
+        moves = state.legal_moves()
+        if len(state.stock) == 0 and len(state.waste) == 0 and len(state.extra) == 1:
+            moves.remove(engine.DRAW)
+        if len(state.extra) != 0 and engine.safe(state.extra[-1], state.foundation):
+            found = engine.move(engine.EXTRA,
+                                engine.FOUNDATION + (state.extra[-1] & 3))
+            if found in moves:
+                return [found]
+
+        placements = []
+        others = []
+        for move in moves:
+            origin = engine.source(move)
+            target = engine.destination(move)
+            if origin == engine.EXTRA:
+                placements.append(move)
+            elif origin < engine.COLUMNS and target < engine.COLUMNS and \
+                 state.hidden[origin] == 0 and \
+                 engine.count(move) == len(state.columns[origin]) and \
+                 len(state.columns[target]) == 0:
+                continue
+            else:
+                others.append(move)
+        return placements + others
+
+    def store(self, value, remaining, bound, depth):
+        """
+        Keeps the estimate for a position and the iteration and depth it
+        was reached at. The least recently stored position is evicted once
+        the table is full.
+        """
+        if value in self.table:
+            self.table.move_to_end(value)
+        elif len(self.table) >= self.table_size:
+            self.table.popitem(last=False)
+        self.table[value] = (remaining, bound, depth)
+        self.table_peak = max(self.table_peak, len(self.table))
+
+    def stats(self) -> dict:
+        return {"nodes" : self.nodes,
+                "seconds" : self.elapsed,
+                "nodes_per_second" : self.nodes / max(self.elapsed, 1e-9),
+                "table_hit_rate" : self.hits / max(self.probes, 1),
+                "table_peak_entries" : self.table_peak,
+                "peak_memory_bytes" : self.peak_memory,
+                "complete" : self.complete,
+                "shortest" : self.is_shortest}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="solve a deal")
+    parser.add_argument("seed", type=int, nargs="?", default=0)
+    parser.add_argument("--nodes", type=int, default=5000000,
+                        help="give up after searching this many positions")
+    parser.add_argument("--table", type=int, default=1 << 20,
+                        help="transposition table entries")
+    parser.add_argument("--memory", action="store_true",
+                        help="trace peak memory, slows the search down")
+    parser.add_argument("--any", action="store_true",
+                        help="stop at the first win found, not the shortest")
+    arguments = parser.parse_args()
+    seed = arguments.seed
+    deal = engine.game(deals.deal(seed), seed)
+    finder = solver(arguments.table, arguments.nodes, arguments.memory, not arguments.any)
+    solution = finder.solve(deal)
+    if solution != None:
+        shortest = "" if finder.is_shortest else ", maybe not the fewest"
+        print(f"deal {seed} won in {len(solution)} moves{shortest}")
+    elif finder.complete:
+        print(f"deal {seed} no win found, every layout was searched")
+    else:
+        print(f"deal {seed} unknown, node budget ran out")
+    for name, value in finder.stats().items():
+        print(f"{name}: {value}")
@@ -0,0 +1,171 @@
+"""
+checks that the move encoding stays consistent everywhere it is read:
+undo restores every earlier state, the solver's incremental hashes match
+hashing from scratch, the move index never drifts from a fresh one, and the
+vectorised games play exactly like the engine. run with
+
+    python -m unittest test_engine
+"""
+import random
+import unittest
+import deals
+import engine
+import journal
+import moveindex
+import solver
+
+try:
+    import numpy
+    import vecenv
+except ImportError:
+    numpy = None
+
+
+def snapshot(state) -> tuple:
+    return (bytes(state.stock), bytes(state.waste), bytes(state.extra),
+            tuple(bytes(cards) for cards in state.columns), bytes(state.hidden),
+            bytes(state.foundation), state.score, state.passes)
+
+
+class undo_test(unittest.TestCase):
+    def test_undo_restores_every_state(self):
+        generator = random.Random(1)
+        flags = 0
+        for seed in range(30):
+            state = engine.game(deals.deal(seed), seed)
+            history = []
+            records = []
+            for x in range(300):
+                legal = state.legal_moves()
+                if len(legal) == 0:
+                    break
+                history.append(snapshot(state))
+                records.append(state.apply(generator.choice(legal)))
+                flags |= records[-1]
+            while len(records) != 0:
+                state.undo(records.pop())
+                self.assertEqual(snapshot(state), history.pop())
+        #every kind of undo flag was exercised
+        for flag in (engine.FLIPPED, engine.SCORED, engine.ROTATED, engine.RECYCLED):
+            self.assertTrue(flags & flag)
+
+    def test_journal_redo_replays_the_same_game(self):
+        generator = random.Random(2)
+        state = engine.game(deals.deal(5), 5)
+        moves = journal.journal()
+        for x in range(200):
+            moves.record(state.apply(generator.choice(state.legal_moves())))
+        final = snapshot(state)
+        while moves.undo(state) != None:
+            pass
+        self.assertEqual(snapshot(state), snapshot(engine.game(deals.deal(5), 5)))
+        while moves.redo(state) != None:
+            pass
+        self.assertEqual(snapshot(state), final)
+
+
+class hash_test(unittest.TestCase):
+    def test_incremental_hash_matches_full_hash(self):
+        finder = solver.solver(table_size=16)
+        for keys in (finder.keys, finder.loose_keys):
+            generator = random.Random(3)
+            for seed in range(10):
+                state = engine.game(deals.deal(seed), seed)
+                value = keys.full_hash(state)
+                for x in range(300):
+                    legal = state.legal_moves()
+                    if len(legal) == 0:
+                        break
+                    record, value = finder.step(state, keys, value, generator.choice(legal))
+                    self.assertEqual(value, keys.full_hash(state))
+
+    def test_loose_hash_ignores_stock_order(self):
+        keys = solver.zobrist(stock_order=False)
+        state = engine.game(deals.deal(4), 4)
+        value = keys.full_hash(state)
+        state.stock.reverse()
+        state.passes += 1
+        self.assertEqual(keys.full_hash(state), value)
+
+    def test_solutions_win(self):
+        finder = solver.solver(max_nodes=5000, shortest=False)
+        for seed in range(5):
+            state = engine.game(deals.deal(seed), seed)
+            solution = finder.solve(state)
+            if solution == None:
+                continue
+            for move in solution:
+                self.assertTrue(state.is_legal(move))
+                state.apply(move)
+            self.assertTrue(state.won())
+
+
+class move_index_test(unittest.TestCase):
+    def test_index_matches_a_fresh_one(self):
+        generator = random.Random(4)
+        for seed in range(10):
+            state = engine.game(deals.deal(seed), seed)
+            index = moveindex.move_index(state)
+            records = []
+            for x in range(200):
+                legal = state.legal_moves()
+                if len(legal) == 0:
+                    break
+                if len(records) != 0 and generator.random() < 0.2:
+                    record = records.pop()
+                    state.undo(record)
+                else:
+                    record = state.apply(generator.choice(legal))
+                    records.append(record)
+                index.moved(record)
+                fresh = moveindex.move_index(state)
+                self.assertEqual(index.table, fresh.table)
+                self.assertEqual(index.total, fresh.total)
+                self.assertEqual(index.stock_side, fresh.stock_side)
+
+
+@unittest.skipIf(numpy == None, "numpy is not installed")
+class vecenv_test(unittest.TestCase):
+    def compare(self, env, row, state):
+        self.assertEqual(bytes(env.stock[row, :env.stock_lengths[row]]), bytes(state.stock))
+        self.assertEqual(bytes(env.waste[row, :env.waste_lengths[row]]), bytes(state.waste))
+        self.assertEqual(bytes(env.extra[row, :env.extra_lengths[row]]), bytes(state.extra))
+        for column in range(engine.COLUMNS):
+            self.assertEqual(bytes(env.columns[row, column, :env.lengths[row, column]]),
+                             bytes(state.columns[column]))
+            self.assertEqual(env.hidden[row, column], state.hidden[column])
+        self.assertEqual(list(env.foundation[row]), list(state.foundation))
+        self.assertEqual(env.score[row], state.score)
+
+    def test_games_match_the_engine(self):
+        size = 32
+        env = vecenv.vector_env(size, first_deal=100, max_moves=400)
+        games = [engine.game(deals.deal(100 + row), 100 + row) for row in range(size)]
+        generator = numpy.random.default_rng(1)
+        for x in range(300):
+            legal = env.legal()
+            for row in range(size):
+                moves = {env.engine_move(row, action) for action in numpy.flatnonzero(legal[row])}
+                self.assertTrue(moves <= set(games[row].legal_moves()))
+            actions = env.random_actions(generator)
+            #some illegal actions too, which must change nothing
+            actions[::7] = generator.integers(0, vecenv.ACTIONS, len(actions[::7]))
+            moves = [env.engine_move(row, action) if legal[row, action] else None
+                     for row, action in enumerate(actions)]
+            observations, rewards, done = env.step(actions)
+            for row in range(size):
+                state = games[row]
+                before = state.score
+                if moves[row] != None:
+                    state.apply(moves[row])
+                if done[row]:
+                    self.assertEqual(state.won(), env.won[row])
+                    deal_number = int(env.deals[row])
+                    games[row] = engine.game(deals.deal(deal_number), deal_number)
+                else:
+                    self.assertEqual(rewards[row], state.score - before)
+                self.compare(env, row, games[row])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,366 @@
+"""
+many games at once as numpy arrays, for training move choosing agents.
+every game in a batch takes one action per step and legality, moves and
+rewards are worked out for the whole batch with array operations. the
+rules mirror the engine's, stock reshuffles included, so a game played
+here plays out the same as it does in the window
+"""
+import argparse
+import time
+import numpy
+import deals
+import engine
+
+#most cards a column can hold, six hidden cards under a king to ace run
+DEPTH = 20
+#cards left in the stock after dealing the columns
+STOCK_SIZE = 24
+#card values used in observations for cards that can't be seen
+HIDDEN = 52
+EMPTY = 53
+
+#actions. the number of cards moved between columns is not part of the
+#action, onto a card only one card of a run can go and onto an empty
+#column the whole face up run goes
+DRAW = 0
+EXTRA_FOUNDATION = 1
+EXTRA_COLUMN = 2
+COLUMN_FOUNDATION = EXTRA_COLUMN + engine.COLUMNS
+COLUMN_COLUMN = COLUMN_FOUNDATION + engine.COLUMNS
+PAIRS = [(origin, target) for origin in range(engine.COLUMNS)
+         for target in range(engine.COLUMNS) if origin != target]
+ACTIONS = COLUMN_COLUMN + len(PAIRS)
+
+#observation layout, one row of uint8 per game
+OBSERVE_COLUMNS = 0
+OBSERVE_EXTRA = engine.COLUMNS * DEPTH
+OBSERVE_FOUNDATION = OBSERVE_EXTRA + 3
+OBSERVE_STOCK = OBSERVE_FOUNDATION + 4
+OBSERVE_WASTE = OBSERVE_STOCK + 1
+OBSERVATION = OBSERVE_WASTE + 1
+
+PAIR_ORIGINS = numpy.array([origin for origin, target in PAIRS])
+PAIR_TARGETS = numpy.array([target for origin, target in PAIRS])
+#place of each pair in a flattened 7x7 origin by target grid
+PAIR_CELLS = PAIR_ORIGINS * engine.COLUMNS + PAIR_TARGETS
+#where each dealt card goes, column by column from the front of the deal
+DEALT_COLUMNS = numpy.array([column for column in range(engine.COLUMNS)
+                             for depth in range(column + 1)])
+DEALT_DEPTHS = numpy.array([depth for column in range(engine.COLUMNS)
+                            for depth in range(column + 1)])
+DEALT = len(DEALT_COLUMNS)
+
+
+def run_tables():
+    """
+    Whether a face up run can go onto a card, and how many of its cards go,
+    for every top card, first face up card and card to go onto. Indexed by
+    top * 2704 + first * 52 + onto. The run goes down one rank at a time
+    with the colours alternating, so the card of the wanted rank has the top
+    card's colour when an even number of ranks away from it.
+    """
+    top, first, onto = numpy.meshgrid(numpy.arange(52), numpy.arange(52), numpy.arange(52),
+                                      indexing="ij")
+    wanted = (onto >> 2) - 1
+    colour = (top >> 1 ^ wanted - (top >> 2)) & 1
+    fits = (wanted >= top >> 2) & (wanted <= first >> 2) & (colour != onto >> 1 & 1)
+    counts = numpy.where(fits, wanted - (top >> 2) + 1, 0)
+    return fits.ravel(), counts.astype(numpy.int64).ravel()
+
+RUN_FITS, RUN_COUNTS = run_tables()
+
+def shown_table():
+    """
+    What each place of a column shows for every hidden count and length, 0
+    where the card shows and HIDDEN or EMPTY otherwise. Every card code is
+    below both so the larger of this and the column is what can be seen.
+    """
+    hidden, length, depth = numpy.meshgrid(numpy.arange(DEPTH + 1), numpy.arange(DEPTH + 1),
+                                           numpy.arange(DEPTH), indexing="ij")
+    return numpy.where(depth < hidden, HIDDEN,
+                       numpy.where(depth < length, 0, EMPTY)).astype(numpy.uint8)
+
+SHOWN = shown_table()
+
+
+def engine_action(move) -> int:
+    """
+    The action for an engine move. Moves onto an empty column all become the
+    action moving the whole face up run.
+    """
+    origin = engine.source(move)
+    target = engine.destination(move)
+    if move == engine.DRAW:
+        return DRAW
+    if origin == engine.EXTRA:
+        if target >= engine.FOUNDATION:
+            return EXTRA_FOUNDATION
+        return EXTRA_COLUMN + target
+    if target >= engine.FOUNDATION:
+        return COLUMN_FOUNDATION + origin
+    return COLUMN_COLUMN + PAIRS.index((origin, target))
+
+
+class vector_env:
+    def __init__(self, games, first_deal=0, max_moves=1000):
+        self.games = games
+        self.max_moves = max_moves
+        self.rows = numpy.arange(games)
+        self.columns = numpy.zeros((games, engine.COLUMNS, DEPTH), numpy.uint8)
+        self.lengths = numpy.zeros((games, engine.COLUMNS), numpy.int64)
+        self.hidden = numpy.zeros((games, engine.COLUMNS), numpy.int64)
+        self.stock = numpy.zeros((games, STOCK_SIZE), numpy.uint8)
+        self.waste = numpy.zeros((games, STOCK_SIZE), numpy.uint8)
+        self.extra = numpy.zeros((games, 3), numpy.uint8)
+        self.stock_lengths = numpy.zeros(games, numpy.int64)
+        self.waste_lengths = numpy.zeros(games, numpy.int64)
+        self.extra_lengths = numpy.zeros(games, numpy.int64)
+        self.foundation = numpy.zeros((games, 4), numpy.int64)
+        self.score = numpy.zeros(games, numpy.int64)
+        self.moves = numpy.zeros(games, numpy.int64)
+        self.passes = numpy.zeros(games, numpy.int64)
+        self.deals = numpy.zeros(games, numpy.int64)
+        #games won on the last step, before they were dealt again
+        self.won = numpy.zeros(games, bool)
+        self.next_deal = first_deal
+        self.mask = None
+        self.reset(self.rows)
+
+    def reset(self, rows):
+        """deals the next deal numbers into the given games"""
+        count = len(rows)
+        if count == 0:
+            return
+        cards = deals.deal_batch(self.next_deal, count)
+        self.deals[rows] = numpy.arange(self.next_deal, self.next_deal + count)
+        self.next_deal += count
+        self.columns[rows[:, None], DEALT_COLUMNS, DEALT_DEPTHS] = cards[:, :DEALT]
+        self.lengths[rows] = numpy.arange(1, engine.COLUMNS + 1)
+        self.hidden[rows] = numpy.arange(engine.COLUMNS)
+        self.stock[rows] = cards[:, DEALT:]
+        self.stock_lengths[rows] = STOCK_SIZE
+        self.waste_lengths[rows] = 0
+        self.extra_lengths[rows] = 0
+        self.foundation[rows] = 0
+        self.score[rows] = 0
+        self.moves[rows] = 0
+        self.passes[rows] = 0
+        self.mask = None
+
+    def legal(self) -> numpy.ndarray:
+        """
+        (games, ACTIONS) bool array of the actions each game may take, the
+        same moves engine.game.is_legal allows.
+        """
+        if self.mask is not None:
+            return self.mask
+        rows = self.rows[:, None]
+        lengths = self.lengths
+        filled = lengths != 0
+        tops = self.columns[rows, numpy.arange(engine.COLUMNS),
+                            numpy.maximum(lengths - 1, 0)].astype(numpy.int64)
+        firsts = self.columns[rows, numpy.arange(engine.COLUMNS),
+                              numpy.minimum(self.hidden, DEPTH - 1)].astype(numpy.int64)
+        has_extra = self.extra_lengths != 0
+        extra = self.extra[self.rows, numpy.maximum(self.extra_lengths - 1, 0)].astype(numpy.int64)
+
+        mask = numpy.zeros((self.games, ACTIONS), bool)
+        mask[:, DRAW] = self.stock_lengths + self.waste_lengths + self.extra_lengths != 0
+        mask[:, EXTRA_FOUNDATION] = has_extra & \
+            (extra >> 2 == self.foundation[self.rows, extra & 3])
+        stacks = ((extra[:, None] ^ tops) & 2 != 0) & ((extra[:, None] >> 2) + 1 == tops >> 2)
+        mask[:, EXTRA_COLUMN:COLUMN_FOUNDATION] = has_extra[:, None] & (~filled | stacks)
+        mask[:, COLUMN_FOUNDATION:COLUMN_COLUMN] = filled & \
+            (tops >> 2 == numpy.take_along_axis(self.foundation, tops & 3, 1))
+
+        #every origin against every target as a 7x7 grid, then the pairs
+        self.runs = tops * 2704 + firsts * 52
+        self.tops = tops
+        fits = RUN_FITS[self.runs[:, :, None] + tops[:, None, :]]
+        grid = filled[:, :, None] & (~filled[:, None, :] | fits)
+        mask[:, COLUMN_COLUMN:] = grid.reshape(self.games, -1)[:, PAIR_CELLS]
+        self.mask = mask
+        return mask
+
+    def engine_move(self, game, action) -> int:
+        """the engine move for an action in one game, see legal"""
+        if action == DRAW:
+            return engine.DRAW
+        if action == EXTRA_FOUNDATION:
+            card = int(self.extra[game, self.extra_lengths[game] - 1])
+            return engine.move(engine.EXTRA, engine.FOUNDATION + (card & 3))
+        if action < COLUMN_FOUNDATION:
+            return engine.move(engine.EXTRA, action - EXTRA_COLUMN)
+        if action < COLUMN_COLUMN:
+            origin = action - COLUMN_FOUNDATION
+            card = int(self.columns[game, origin, self.lengths[game, origin] - 1])
+            return engine.move(origin, engine.FOUNDATION + (card & 3))
+        origin, target = PAIRS[action - COLUMN_COLUMN]
+        rows = numpy.array([game])
+        counts = self.counts(rows, numpy.array([origin]), numpy.array([target]))
+        return engine.move(origin, target, int(counts[0]))
+
+    def counts(self, rows, origins, targets) -> numpy.ndarray:
+        """
+        Cards moved from origin to target columns in the given games. Onto a
+        card only the card one rank lower can go, onto an empty column the
+        whole face up run goes.
+        """
+        self.legal()
+        onto = self.runs[rows, origins] + self.tops[rows, targets]
+        return numpy.where(self.lengths[rows, targets] != 0, RUN_COUNTS[onto],
+                           self.lengths[rows, origins] - self.hidden[rows, origins])
+
+    def step(self, actions):
+        """
+        Plays one action in every game. Illegal actions change nothing but
+        still count as a move. Returns the observations, the score each game
+        gained as its reward and which games ended, by winning or running
+        out of moves. Ended games are dealt the next deal straight away.
+        """
+        actions = numpy.asarray(actions)
+        legal = self.legal()[self.rows, actions]
+        before = self.score.copy()
+
+        rows = numpy.flatnonzero(legal & (actions == DRAW))
+        if len(rows) != 0:
+            self.draw(rows)
+        rows = numpy.flatnonzero(legal & (actions == EXTRA_FOUNDATION))
+        if len(rows) != 0:
+            cards = self.extra[rows, self.extra_lengths[rows] - 1]
+            self.foundation[rows, cards & 3] += 1
+            self.extra_lengths[rows] -= 1
+        rows = numpy.flatnonzero(legal & (actions >= EXTRA_COLUMN) &
+                                 (actions < COLUMN_FOUNDATION))
+        if len(rows) != 0:
+            targets = actions[rows] - EXTRA_COLUMN
+            cards = self.extra[rows, self.extra_lengths[rows] - 1]
+            self.place(rows, targets, cards[:, None], numpy.ones(len(rows), numpy.int64))
+            self.extra_lengths[rows] -= 1
+        rows = numpy.flatnonzero(legal & (actions >= COLUMN_FOUNDATION) &
+                                 (actions < COLUMN_COLUMN))
+        if len(rows) != 0:
+            origins = actions[rows] - COLUMN_FOUNDATION
+            self.lengths[rows, origins] -= 1
+            cards = self.columns[rows, origins, self.lengths[rows, origins]]
+            self.foundation[rows, cards & 3] += 1
+            self.flip(rows, origins)
+        rows = numpy.flatnonzero(legal & (actions >= COLUMN_COLUMN))
+        if len(rows) != 0:
+            pairs = actions[rows] - COLUMN_COLUMN
+            origins = PAIR_ORIGINS[pairs]
+            counts = self.counts(rows, origins, PAIR_TARGETS[pairs])
+            self.lengths[rows, origins] -= counts
+            depths = numpy.minimum(self.lengths[rows, origins][:, None] + numpy.arange(13),
+                                   DEPTH - 1)
+            cards = self.columns[rows[:, None], origins[:, None], depths]
+            self.place(rows, PAIR_TARGETS[pairs], cards, counts)
+            self.flip(rows, origins)
+
+        self.mask = None
+        self.moves += 1
+        rewards = self.score - before
+        self.won = self.stock_lengths + self.waste_lengths + self.extra_lengths == 0
+        dones = self.won | (self.moves >= self.max_moves)
+        self.reset(numpy.flatnonzero(dones))
+        return self.observe(), rewards, dones
+
+    def place(self, rows, targets, cards, counts):
+        """puts the first counts cards of each row of cards on a column"""
+        lengths = self.lengths[rows, targets]
+        self.score[rows] += lengths != 0
+        used = numpy.arange(cards.shape[1]) < counts[:, None]
+        depths = lengths[:, None] + numpy.arange(cards.shape[1])
+        every = numpy.broadcast_to(rows[:, None], used.shape)
+        self.columns[every[used], numpy.broadcast_to(targets[:, None], used.shape)[used],
+                     depths[used]] = cards[used]
+        self.lengths[rows, targets] += counts
+
+    def flip(self, rows, origins):
+        """turns over the top card of columns left with only hidden cards"""
+        hidden = self.hidden[rows, origins]
+        flipped = (hidden != 0) & (hidden == self.lengths[rows, origins])
+        self.hidden[rows[flipped], origins[flipped]] -= 1
+
+    def draw(self, rows):
+        #three extra cards showing go to the waste first
+        rotated = rows[(self.extra_lengths[rows] >= 3) & (self.stock_lengths[rows] != 0)]
+        if len(rotated) != 0:
+            depths = self.waste_lengths[rotated][:, None] + numpy.arange(3)
+            self.waste[rotated[:, None], depths] = self.extra[rotated]
+            self.waste_lengths[rotated] += 3
+            self.extra_lengths[rotated] = 0
+        recycled = rows[self.stock_lengths[rows] == 0]
+        if len(recycled) != 0:
+            self.recycle(recycled)
+        self.extra[rows, self.extra_lengths[rows]] = self.stock[rows, self.stock_lengths[rows] - 1]
+        self.stock_lengths[rows] -= 1
+        self.extra_lengths[rows] += 1
+        self.score[rows] += 1
+
+    def recycle(self, rows):
+        """
+        Shuffles the waste and extra cards back into empty stocks like
+        game.draw. Without a waste the extra cards go back, with fewer than
+        three extra cards only the waste, otherwise both.
+        """
+        waste = self.waste_lengths[rows]
+        extra = self.extra_lengths[rows]
+        from_waste = waste
+        from_extra = numpy.where((waste == 0) | (extra >= 3), extra, 0)
+        sizes = from_waste + from_extra
+        #waste then extra cards side by side, each row taking what it uses
+        pool = numpy.concatenate((self.waste[rows], self.extra[rows]), 1)
+        places = numpy.arange(STOCK_SIZE)
+        places = numpy.where(places < from_waste[:, None], places,
+                             STOCK_SIZE + places - from_waste[:, None])
+        cards = numpy.take_along_axis(pool, numpy.minimum(places, STOCK_SIZE + 2), 1)
+        order = deals.order_batch(sizes, self.deals[rows], self.passes[rows])
+        used = numpy.arange(order.shape[1]) < sizes[:, None]
+        every = numpy.broadcast_to(rows[:, None], used.shape)
+        self.stock[every[used], numpy.broadcast_to(numpy.arange(order.shape[1]),
+                                                   used.shape)[used]] = \
+            numpy.take_along_axis(cards, order, 1)[used]
+        self.stock_lengths[rows] = sizes
+        self.waste_lengths[rows] -= from_waste
+        self.extra_lengths[rows] -= from_extra
+        self.passes[rows] += 1
+
+    def observe(self) -> numpy.ndarray:
+        """
+        (games, OBSERVATION) uint8 array of what a player can see, cards
+        still face down show as HIDDEN and unused places as EMPTY.
+        """
+        columns = numpy.maximum(self.columns, SHOWN[self.hidden, self.lengths])
+        observations = numpy.empty((self.games, OBSERVATION), numpy.uint8)
+        observations[:, OBSERVE_COLUMNS:OBSERVE_EXTRA] = columns.reshape(self.games, -1)
+        observations[:, OBSERVE_EXTRA:OBSERVE_FOUNDATION] = numpy.where(
+            numpy.arange(3) < self.extra_lengths[:, None], self.extra, EMPTY)
+        observations[:, OBSERVE_FOUNDATION:OBSERVE_STOCK] = self.foundation
+        observations[:, OBSERVE_STOCK] = self.stock_lengths
+        observations[:, OBSERVE_WASTE] = self.waste_lengths
+        return observations
+
+    def random_actions(self, generator) -> numpy.ndarray:
+        """a random legal action for every game"""
+        return numpy.argmax(self.legal() * generator.random((self.games, ACTIONS)), 1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="time random play in the vector environment")
+    parser.add_argument("--games", type=int, default=4096)
+    parser.add_argument("--steps", type=int, default=500)
+    parser.add_argument("--moves", type=int, default=1000,
+                        help="moves before a game is given up and dealt again")
+    arguments = parser.parse_args()
+    env = vector_env(arguments.games, max_moves=arguments.moves)
+    generator = numpy.random.default_rng(0)
+    finished = wins = 0
+    started = time.perf_counter()
+    for step in range(arguments.steps):
+        observations, rewards, dones = env.step(env.random_actions(generator))
+        finished += dones.sum()
+        wins += env.won.sum()
+    elapsed = time.perf_counter() - started
+    print(f"{arguments.games * arguments.steps / elapsed:.0f} steps per second")
+    print(f"games finished: {finished}, won: {wins}")